@@ -0,0 +1,340 @@
+"""
+Benchmark suite for the game engine.
+
+Times story construction, single transitions, format_text, full main()
+playthroughs, process start-up and memory per session, on the built-in story and on synthetic
+stories of the requested sizes. Results are written as JSON and can be
+compared against a stored baseline:
+
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --baseline baseline.json --threshold 0.25
+
+With --reference REV the cold start of the game at a git revision is timed too, so
+cold_start.script can be held against the entry point from before a series of changes.
+"""
+import argparse
+import builtins
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from contextlib import contextmanager
+
+import simple_game
+import compact_state
+import metrics
+import story_format
+
+DEFAULT_SIZES = (10_000, 100_000)
+
+# --- Synthetic Stories ---
+
+def synthetic_story(size, flags=16):
+    """
+    Returns node functions for a story with size rooms in a chain.
+    Rooms can move on, go back, or take a secret exit guarded by one of the flags;
+    every tenth room sets a flag. Node text reads the module-level state and player.
+    """
+    def room(i):
+        next_id = f"room{i + 1}" if i + 1 < size else "ending"
+        flag = f"flag{i % flags}"
+        onward = {"text": "Walk **onward**", "next_text": next_id}
+        if i % 10 == 0:
+            onward["set_state"] = {flag: True}
+        return lambda: {
+            "id": f"room{i}",
+            "text": f"Room {i} of {size}, {simple_game.player['name']}.\nThe walls are *grey* and the floor is **stone**.",
+            "choices": [
+                onward,
+                {"text": "Go back", "next_text": f"room{max(i - 1, 0)}"},
+                {
+                    "text": "Take the secret exit",
+                    "required_state": {"key": flag, "op": "is", "value": True, "default": False},
+                    "next_text": "ending",
+                },
+            ],
+        }
+
+    factories = {
+        "intro": lambda: {"id": "intro", "text": "A synthetic story.", "choices": [{"text": "Next", "next_text": "askName"}]},
+        "askName": lambda: {
+            "id": "askName",
+            "text": "What is your name?",
+            "input_prompt": "Enter your name: ",
+            "next_text": "room0",
+            "after_enter": lambda user_input: simple_game.player.update({"name": user_input.strip() or "Wanderer"}),
+        },
+        "ending": lambda: {
+            "id": "ending",
+            "text": f"**Well done, {simple_game.player['name']}!**",
+            "choices": [{"text": "Play Again?", "next_text": "restart"}, {"text": "Quit", "next_text": "quit"}],
+        },
+    }
+    for i in range(size):
+        factories[f"room{i}"] = room(i)
+    return factories
+
+def synthetic_story_data(size, flags=16):
+    """The synthetic story as story file data (see story_format), for snapshot benchmarks."""
+    nodes = {
+        "intro": {"text": "A synthetic story.", "choices": [{"text": "Next", "next_text": "askName"}]},
+        "askName": {"text": "What is your name?", "input_prompt": "Enter your name: ", "next_text": "room0",
+                    "after_enter": {"set_player": "name", "default": "Wanderer"}},
+        "ending": {"text": "**Well done, {player.name}!**",
+                   "choices": [{"text": "Play Again?", "next_text": "restart"}, {"text": "Quit", "next_text": "quit"}]},
+    }
+    for i in range(size):
+        flag = f"flag{i % flags}"
+        onward = {"text": "Walk **onward**", "next_text": f"room{i + 1}" if i + 1 < size else "ending"}
+        if i % 10 == 0:
+            onward["set_state"] = {flag: True}
+        nodes[f"room{i}"] = {
+            "text": f"Room {i} of {size}, {{player.name}}.\nThe walls are *grey* and the floor is **stone**.",
+            "choices": [
+                onward,
+                {"text": "Go back", "next_text": f"room{max(i - 1, 0)}"},
+                {"text": "Take the secret exit", "next_text": "ending",
+                 "required_state": {"key": flag, "op": "is", "value": True, "default": False}},
+            ],
+        }
+    return nodes
+
+def synthetic_script(size):
+    """Raw inputs that walk a synthetic story from intro to its ending and quit."""
+    return ["1", "Bench"] + ["1"] * size + ["2"]
+
+# --- I/O Stubs ---
+
+class _NullRenderer(simple_game.Renderer):
+    """Stands in for simple_game.renderer so benchmarks measure the engine, not the terminal."""
+    def present(self, lines):
+        pass
+    def message(self, text):
+        pass
+    def clear(self):
+        pass
+
+@contextmanager
+def stubbed_io(inputs, story=None):
+    """Feeds inputs to input(), discards all output and optionally swaps in another story."""
+    feed = iter(inputs)
+    saved = builtins.input, sys.stdout, simple_game.renderer, simple_game.registry
+    builtins.input = lambda prompt="": next(feed)
+    sys.stdout = io.StringIO()
+    simple_game.renderer = _NullRenderer()
+    if story is not None:
+        simple_game.registry = story
+    try:
+        yield
+    finally:
+        builtins.input, sys.stdout, simple_game.renderer, simple_game.registry = saved
+
+# --- Measurements ---
+
+def _best_of(function, repeat, number):
+    """Returns the best time per call over repeat rounds of number calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+def bench_story_build(factory, repeat=3):
+    """Seconds to build the node functions and a fresh registry."""
+    return _best_of(lambda: simple_game.StoryRegistry(factory()), repeat, 1)
+
+def bench_transition(story, node_id, selection, repeat=5, number=2000):
+    """Seconds for one show_text_node call with I/O stubbed out (node cache warm)."""
+    simple_game.state, simple_game.player = {}, {"name": "Wanderer"}
+    with stubbed_io(iter(lambda: selection, None), story):
+        return _best_of(lambda: simple_game.show_text_node(node_id), repeat, number)
+
+def bench_instrumented_transition(story, node_id, selection, repeat=5, number=2000):
+    """bench_transition with simple_game.metrics enabled, to show what instrumentation costs."""
+    saved = simple_game.metrics
+    simple_game.metrics = metrics.Metrics()
+    try:
+        return bench_transition(story, node_id, selection, repeat, number)
+    finally:
+        simple_game.metrics = saved
+
+def bench_format_text(size, mode="plain", repeat=5, number=20):
+    """Seconds to format a text of roughly size characters, bypassing the format_text cache."""
+    text = ("Some **bold** words and some *italic* ones. " * (size // 44 + 1))[:size]
+    return _best_of(lambda: simple_game._render_markup(text, mode), repeat, number)
+
+def bench_playthrough(inputs, story=None, repeat=3):
+    """Seconds for a full main() run that consumes inputs."""
+    def run():
+        with stubbed_io(inputs, story):
+            simple_game.main()
+    return _best_of(run, repeat, 1)
+
+def bench_snapshot_start(size, repeat=3):
+    """Seconds to open a compiled snapshot of a synthetic story and build the intro frame."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "story.snap")
+        story_format.compile_snapshot(synthetic_story_data(size), path)
+        def start():
+            snapshot = story_format.load_snapshot(path)
+            simple_game.StoryRegistry(snapshot).get("intro")
+            snapshot.close()
+        return _best_of(start, repeat, 1)
+
+def _time_launch(command, directory, repeat, check=True):
+    """
+    Best seconds for command to run in directory with empty input. Bytecode caching is left on,
+    as it is for players, and one untimed run first fills __pycache__ and the OS file cache.
+    """
+    environment = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    def start():
+        subprocess.run(
+            command, cwd=directory, env=environment,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=check,
+        )
+    start()
+    return _best_of(start, repeat, 1)
+
+def bench_cold_start(args=(), module=False, repeat=3):
+    """
+    Seconds for a new `python simple_game.py` process (`python -m simple_game` with module)
+    to draw the intro frame and exit at the end of its empty input.
+    """
+    directory = os.path.dirname(os.path.abspath(simple_game.__file__))
+    command = [sys.executable, "-m", "simple_game"] if module else [sys.executable, os.path.join(directory, "simple_game.py")]
+    return _time_launch(command + list(args), directory, repeat)
+
+def bench_cold_start_revision(revision, repeat=3):
+    """
+    bench_cold_start for `python simple_game.py` as of a git revision, e.g. the commit before
+    a series of changes, checked out into a temporary directory. Older games may stop with
+    an error at the end of their empty input, so the exit status is not checked.
+    """
+    directory = os.path.dirname(os.path.abspath(simple_game.__file__))
+    archive = subprocess.run(["git", "archive", revision], cwd=directory, capture_output=True, check=True).stdout
+    with tempfile.TemporaryDirectory() as temporary:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(temporary, **({"filter": "data"} if hasattr(tarfile, "data_filter") else {}))
+        return _time_launch([sys.executable, os.path.join(temporary, "simple_game.py")], temporary, repeat, check=False)
+
+def bench_cold_start_snapshot(repeat=3):
+    """bench_cold_start with the built-in story loaded from a compiled snapshot."""
+    directory = os.path.dirname(os.path.abspath(simple_game.__file__))
+    with open(os.path.join(directory, "stories", "simple_choice.json"), encoding="utf-8") as story:
+        nodes = json.load(story)["nodes"]
+    with tempfile.TemporaryDirectory() as temporary:
+        path = os.path.join(temporary, "story.snap")
+        story_format.compile_snapshot(nodes, path)
+        return bench_cold_start(["--story", path], repeat=repeat)
+
+def _deep_size(obj, seen):
+    """Bytes of obj and everything it holds; objects already in seen (shared ones) are counted once."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (tuple, list)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    else:
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += _deep_size(getattr(obj, slot), seen)
+    return size
+
+def bench_session_memory(count=10_000):
+    """
+    Bytes per session for plain state/player dicts and for CompactSession, summed with
+    sys.getsizeof so that only the sessions' own objects are counted.
+    """
+    names = [f"Player{i}" for i in range(count)]
+    schema = compact_state.SessionSchema(["hasKey"], sorted(simple_game.registry.factories))
+    results = {}
+    for label, make in (
+        ("dicts", lambda name: ({"hasKey": True}, {"name": name}, "greeting")),
+        ("compact", lambda name: compact_state.CompactSession.pack(schema, "greeting", {"hasKey": True}, {"name": name})),
+    ):
+        sessions = [make(name) for name in names]
+        seen = set()
+        results[label] = sum(_deep_size(session, seen) for session in sessions) / count
+    return results
+
+WINNING_SCRIPT = ["1", "Bench", "2", "1", "1", "2", "2"]
+
+def run_benchmarks(sizes=DEFAULT_SIZES, quick=False, reference=None):
+    """
+    Runs every benchmark and returns {name: value}; times are seconds per operation, memory is bytes.
+    With reference (a git revision) the cold start of that revision's game is timed as well.
+    """
+    repeat = 1 if quick else 3
+    results = {
+        "get_text_nodes": _best_of(simple_game.get_text_nodes, repeat, 1000),
+        "transition.greeting": bench_transition(simple_game.registry, "greeting", "1", repeat, 200 if quick else 2000),
+        "transition.greeting.metrics": bench_instrumented_transition(simple_game.registry, "greeting", "1", repeat, 200 if quick else 2000),
+        "format_text.10k": bench_format_text(10_000, repeat=repeat),
+        "format_text.100k": bench_format_text(100_000, repeat=repeat),
+        "format_text.100k.ansi": bench_format_text(100_000, "ansi", repeat),
+        "playthrough.secretEnding": bench_playthrough(WINNING_SCRIPT, repeat=repeat),
+    }
+    results["cold_start.script"] = bench_cold_start(repeat=repeat)
+    results["cold_start.module"] = bench_cold_start(module=True, repeat=repeat)
+    results["cold_start.snapshot"] = bench_cold_start_snapshot(repeat)
+    if reference:
+        results["cold_start.reference"] = bench_cold_start_revision(reference, repeat)
+    for label, value in bench_session_memory(1000 if quick else 10_000).items():
+        results[f"memory_per_session.{label}"] = value
+
+    for size in sizes:
+        results[f"story_build.{size}"] = bench_story_build(lambda: synthetic_story(size), repeat)
+        story = simple_game.StoryRegistry(synthetic_story(size))
+        results[f"transition.{size}"] = bench_transition(story, f"room{size // 2}", "2", repeat, 200 if quick else 2000)
+        results[f"playthrough.{size}"] = bench_playthrough(synthetic_script(size), story, repeat=1)
+        results[f"snapshot_start.{size}"] = bench_snapshot_start(size, repeat)
+    return results
+
+def compare(results, baseline, threshold=0.25):
+    """Returns (name, baseline, current) for every result more than threshold worse than baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current > previous * (1 + threshold):
+            regressions.append((name, previous, current))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Simple Choice engine.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(DEFAULT_SIZES), help="synthetic story sizes")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results stored in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, e.g. 0.25 for 25%%")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions, for smoke runs")
+    parser.add_argument("--reference", metavar="REV", help="also time the cold start of simple_game.py at this git revision")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.quick, args.reference)
+    report = {"python": platform.python_version(), "results": results}
+    for name, value in results.items():
+        unit = "B" if name.startswith("memory") else "s"
+        print(f"{name:32} {value:.6g} {unit}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as stored:
+            regressions = compare(results, json.load(stored)["results"], args.threshold)
+        for name, previous, current in regressions:
+            print(f"REGRESSION {name}: {previous:.6g} -> {current:.6g}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
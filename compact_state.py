@@ -0,0 +1,152 @@
+"""
+Compact representation of a suspended game session.
+
+A session is normally two dicts (state and player) plus the current node id.
+Here declared boolean flags are packed into one integer bitset, the node id
+becomes an index into the story's node list and player names are interned,
+so a suspended session costs a few dozen bytes in memory and about ten on disk.
+"""
+import json
+import sys
+
+import simple_game
+
+class SessionSchema:
+    """The flags and node ids a story uses, in a fixed order that defines the packed layout."""
+
+    def __init__(self, flags, node_ids):
+        self.flags = tuple(flags)
+        self.node_ids = tuple(node_ids)
+        self._flag_bits = {flag: 1 << i for i, flag in enumerate(self.flags)}
+        self._node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+    @classmethod
+    def from_story(cls, story=None):
+        """Builds a schema from every boolean set_state key the story can reach."""
+        import explore # Only needed to discover flags
+        story = story or simple_game.registry
+        explorer = explore.Explorer(story)
+        report = explorer.explore()
+        flags = set()
+        for node_id, canon in report.reachable:
+            if node_id in story:
+                for _, _, delta in explorer.transitions(node_id, dict(canon)):
+                    flags.update(key for key, value in delta.items() if isinstance(value, bool))
+            flags.update(key for key, value in canon if isinstance(value, bool))
+        return cls(sorted(flags), sorted(story.factories))
+
+    def flag_bit(self, flag):
+        return self._flag_bits.get(flag)
+
+    def node_index(self, node_id):
+        return self._node_index[node_id]
+
+class CompactSession:
+    """
+    A suspended session: node index, flag bitset, interned name and any leftovers.
+    A flag bit is set when the flag is True; flags that are False and state keys
+    outside the schema are kept in extra so the session round-trips exactly.
+    """
+
+    __slots__ = ("node", "flags", "name", "extra")
+
+    def __init__(self, node, flags, name, extra=None):
+        self.node = node
+        self.flags = flags
+        self.name = sys.intern(name)
+        self.extra = extra # None, or (leftover state dict, leftover player dict)
+
+    @classmethod
+    def pack(cls, schema, node_id, session_state, session_player):
+        """Packs a node id, state dict and player dict."""
+        flags = 0
+        state_rest = {}
+        for key, value in session_state.items():
+            bit = schema.flag_bit(key)
+            if bit is not None and value is True:
+                flags |= bit
+            else:
+                state_rest[key] = value
+        player_rest = {key: value for key, value in session_player.items() if key != "name"}
+        extra = (state_rest, player_rest) if state_rest or player_rest else None
+        return cls(schema.node_index(node_id), flags, session_player["name"], extra)
+
+    def unpack(self, schema):
+        """Returns (node_id, state, player) as fresh dicts."""
+        session_state = {flag: True for i, flag in enumerate(schema.flags) if self.flags >> i & 1}
+        session_player = {"name": self.name}
+        if self.extra is not None:
+            session_state.update(self.extra[0])
+            session_player.update(self.extra[1])
+        return schema.node_ids[self.node], session_state, session_player
+
+    def to_bytes(self):
+        """Serializes as varint node, varint flags, length-prefixed name, then optional JSON leftovers."""
+        name = self.name.encode("utf-8")
+        data = bytearray()
+        _write_varint(data, self.node)
+        _write_varint(data, self.flags)
+        _write_varint(data, len(name))
+        data += name
+        if self.extra is not None:
+            data += json.dumps(self.extra, separators=(",", ":")).encode("utf-8")
+        return bytes(data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        node, offset = _read_varint(data, 0)
+        flags, offset = _read_varint(data, offset)
+        length, offset = _read_varint(data, offset)
+        name = data[offset:offset + length].decode("utf-8")
+        offset += length
+        extra = None
+        if offset < len(data):
+            state_rest, player_rest = json.loads(data[offset:].decode("utf-8"))
+            extra = (state_rest, player_rest)
+        return cls(node, flags, name, extra)
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactSession):
+            return NotImplemented
+        return (self.node, self.flags, self.name, self.extra) == (other.node, other.flags, other.name, other.extra)
+
+    def __repr__(self):
+        return f"CompactSession(node={self.node}, flags={self.flags:#x}, name={self.name!r}, extra={self.extra!r})"
+
+# --- Bulk Persistence ---
+
+def write_sessions(sessions, stream):
+    """Writes CompactSessions to a binary stream as length-prefixed records."""
+    buffer = bytearray()
+    for session in sessions:
+        record = session.to_bytes()
+        _write_varint(buffer, len(record))
+        buffer += record
+    stream.write(buffer)
+
+def read_sessions(stream):
+    """Reads back the CompactSessions written by write_sessions."""
+    data = stream.read()
+    offset = 0
+    while offset < len(data):
+        length, offset = _read_varint(data, offset)
+        yield CompactSession.from_bytes(data[offset:offset + length])
+        offset += length
+
+def _write_varint(buffer, value):
+    """Appends a non-negative integer using 7 bits per byte."""
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def _read_varint(data, offset):
+    """Returns (value, next offset) for the varint starting at offset."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
@@ -0,0 +1,160 @@
+"""
+Reachability explorer: enumerates every (node id, state) pair the story can reach.
+
+Starting from "intro", it follows choices, required_state guards and set_state
+effects, then reports unreachable nodes, dangling next_text targets and states
+from which no goal can be reached.
+"""
+import sys
+from collections import deque, namedtuple
+
+import simple_game
+
+DEFAULT_GOALS = ("secretEnding", "quit")
+
+# reachable: every (node_id, canonical_state) pair found, in discovery order
+# edges: pair -> list of (choice_position, target_pair); choice_position is the index
+#        into the node's available choices, or None for input nodes and the fallback quit
+# unreachable_nodes: node ids never visited, dangling_targets: (node_id, missing_target) pairs
+# stuck_states: reachable pairs that can never reach a goal
+ExplorationReport = namedtuple("ExplorationReport", [
+    "reachable", "edges", "unreachable_nodes", "dangling_targets", "stuck_states", "truncated"
+])
+
+def canonical_state(current_state):
+    """Returns a hashable, order-independent form of a state dict (values must be hashable)."""
+    return tuple(sorted(current_state.items()))
+
+class Explorer:
+    """
+    Walks the (node, state) graph of a story.
+    Transitions are memoized on the values of the state keys that the node and
+    its guards actually read, so states differing only in unrelated flags share work.
+    """
+
+    def __init__(self, story=None, sample_input=""):
+        self.story = story or simple_game.registry
+        self.sample_input = sample_input # Text fed to input nodes' after_enter
+        self._memo = {} # node_id -> {dependency keys: {dependency values: transitions}}
+
+    def transitions(self, node_id, current_state):
+        """
+        Returns the moves out of node_id in the given state as a list of
+        (choice_position, next_node_id, state_delta) tuples.
+        """
+        known = self._memo.setdefault(node_id, {})
+        for keys, by_values in known.items():
+            values = tuple(current_state.get(key, simple_game._MISSING) for key in keys)
+            if values in by_values:
+                return by_values[values]
+
+        tracked = simple_game._TrackingDict(current_state)
+        result = self._evaluate(node_id, tracked)
+        if tracked.reads_all:
+            return result # Depends on the whole state, nothing to memoize on
+
+        keys = tuple(sorted(tracked.reads))
+        values = tuple(current_state.get(key, simple_game._MISSING) for key in keys)
+        known.setdefault(keys, {})[values] = result
+        return result
+
+    def _evaluate(self, node_id, tracked):
+        with simple_game.bound_session(tracked, {"name": "Wanderer"}):
+            # Bypass the registry cache so reads are tracked
+            node = simple_game.compile_node(self.story.factories[node_id]())
+            if node.get("input_prompt"):
+                before = dict.copy(tracked)
+                if node.get("after_enter"):
+                    node["after_enter"](self.sample_input)
+                after = dict.copy(tracked)
+                delta = {key: after[key] for key in simple_game._changed_keys(before, after) if key in after}
+                dict.clear(tracked)
+                dict.update(tracked, before)
+                return [(None, node.get("next_text"), delta)]
+
+            choices = simple_game.available_choices(node, tracked)
+        if not choices:
+            return [(None, "quit", {})] # Only the fallback "Q. Quit" is offered
+        return [(i, choice.get("next_text"), dict(choice.get("set_state", {}))) for i, choice in enumerate(choices)]
+
+    def explore(self, start="intro", initial_state=None, goals=DEFAULT_GOALS, max_states=1_000_000):
+        """Runs a breadth-first search over (node, state) pairs and returns an ExplorationReport."""
+        start_pair = (start, canonical_state(initial_state or {}))
+        edges = {}
+        dangling = set()
+        queue = deque([start_pair])
+        seen = {start_pair}
+        truncated = False
+
+        while queue:
+            pair = queue.popleft()
+            node_id, canon = pair
+            if node_id in simple_game.TERMINALS:
+                edges[pair] = []
+                continue
+            if node_id not in self.story:
+                edges[pair] = []
+                continue
+
+            current_state = dict(canon)
+            out = []
+            for position, next_node_id, delta in self.transitions(node_id, current_state):
+                if next_node_id not in simple_game.TERMINALS and next_node_id not in self.story:
+                    dangling.add((node_id, next_node_id))
+                target = (next_node_id, canonical_state({**current_state, **delta}) if delta else canon)
+                out.append((position, target))
+                if target not in seen:
+                    if len(seen) >= max_states:
+                        truncated = True
+                        continue
+                    seen.add(target)
+                    queue.append(target)
+            edges[pair] = out
+
+        visited_nodes = {node_id for node_id, _ in edges}
+        unreachable = sorted(node_id for node_id in self.story.factories if node_id not in visited_nodes)
+        return ExplorationReport(
+            reachable=list(edges),
+            edges=edges,
+            unreachable_nodes=unreachable,
+            dangling_targets=sorted(dangling, key=str),
+            stuck_states=self._stuck_states(edges, goals),
+            truncated=truncated,
+        )
+
+    @staticmethod
+    def _stuck_states(edges, goals):
+        """Returns the pairs from which no pair whose node is a goal can be reached."""
+        reverse = {}
+        for pair, out in edges.items():
+            for _, target in out:
+                reverse.setdefault(target, []).append(pair)
+
+        can_finish = {pair for pair in edges if pair[0] in goals}
+        queue = deque(can_finish)
+        while queue:
+            for source in reverse.get(queue.popleft(), ()):
+                if source not in can_finish:
+                    can_finish.add(source)
+                    queue.append(source)
+        return [pair for pair in edges if pair not in can_finish and pair[0] not in simple_game.TERMINALS]
+
+def explore(story=None, start="intro", goals=DEFAULT_GOALS):
+    """Explores a story (default: the built-in one) and returns an ExplorationReport."""
+    return Explorer(story).explore(start, goals=goals)
+
+def print_report(report, out=None):
+    """Prints a human-readable summary of an ExplorationReport."""
+    out = out or sys.stdout
+    print(f"Reachable (node, state) pairs: {len(report.reachable)}", file=out)
+    print(f"Transitions: {sum(len(targets) for targets in report.edges.values())}", file=out)
+    if report.truncated:
+        print("Warning: state limit reached, results are partial.", file=out)
+    print(f"Unreachable nodes: {', '.join(report.unreachable_nodes) or 'none'}", file=out)
+    for node_id, target in report.dangling_targets:
+        print(f"Dangling target: {node_id} -> {target}", file=out)
+    for node_id, canon in report.stuck_states:
+        print(f"Stuck state: {node_id} {dict(canon)}", file=out)
+
+if __name__ == "__main__":
+    print_report(explore())
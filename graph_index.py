@@ -0,0 +1,100 @@
+"""
+Precomputed analysis index over a story's graph.
+
+Built once from the (node, state) graph found by explore.Explorer, so set_state
+flags such as hasKey are part of every path. Holds forward and reverse
+adjacency, per-ending shortest-path distances and a table answering
+"which available choice gets closest to this ending from here" with one lookup.
+"""
+from collections import deque
+
+import explore
+import simple_game
+
+class GraphIndex:
+    """
+    Distances and hints for a story. endings defaults to every node that can leave
+    the game directly (i.e. has a choice leading to "quit" or "restart").
+    """
+
+    def __init__(self, story=None, start="intro", endings=None):
+        self.story = story or simple_game.registry
+        report = explore.Explorer(self.story).explore(start)
+        self.edges = report.edges # (node, state) -> [(choice position, target pair)]
+        self.reverse_edges = {}
+        for pair, out in self.edges.items():
+            for _, target in out:
+                self.reverse_edges.setdefault(target, []).append(pair)
+
+        # Node-level adjacency, with flags folded away
+        self.forward = {}
+        self.reverse = {}
+        for (node_id, _), out in self.edges.items():
+            for _, (target_id, _) in out:
+                self.forward.setdefault(node_id, set()).add(target_id)
+                self.reverse.setdefault(target_id, set()).add(node_id)
+
+        if endings is None:
+            endings = sorted({
+                node_id for node_id, targets in self.forward.items()
+                if node_id not in simple_game.TERMINALS and targets & set(simple_game.TERMINALS)
+            })
+        self.endings = tuple(endings)
+        self.distances = {ending: self._distances_to(ending) for ending in self.endings}
+        self._hints = {ending: self._best_choices(self.distances[ending]) for ending in self.endings}
+
+    def _distances_to(self, ending):
+        """Breadth-first search backwards from every state of the ending node."""
+        distances = {pair: 0 for pair in self.edges if pair[0] == ending}
+        queue = deque(distances)
+        while queue:
+            pair = queue.popleft()
+            for source in self.reverse_edges.get(pair, ()):
+                if source not in distances:
+                    distances[source] = distances[pair] + 1
+                    queue.append(source)
+        return distances
+
+    def _best_choices(self, distances):
+        """Maps each pair to (choice position, distance) of the move that gets closest to the ending."""
+        best = {}
+        for pair, out in self.edges.items():
+            candidates = [(distances[target], position) for position, target in out if target in distances]
+            if candidates and distances.get(pair):
+                distance, position = min(candidates, key=lambda candidate: candidate[0])
+                best[pair] = (position, distance + 1)
+        return best
+
+    def _ending(self, ending):
+        """The ending to aim for: the given one, or else the first of self.endings (None if there are none)."""
+        if ending is None and self.endings:
+            return self.endings[0]
+        return ending
+
+    def distance(self, node_id, current_state, ending=None):
+        """Steps from node_id in current_state to ending (default: the first ending), or None if it can't be reached."""
+        distances = self.distances.get(self._ending(ending), {})
+        return distances.get((node_id, explore.canonical_state(current_state)))
+
+    def hint(self, node_id, current_state, ending=None):
+        """
+        Returns (choice position, steps to ending) for the best available choice,
+        or None if the ending can't be reached (or the player is already there).
+        choice position indexes the node's available choices; it is None for input nodes.
+        """
+        hints = self._hints.get(self._ending(ending), {})
+        return hints.get((node_id, explore.canonical_state(current_state)))
+
+    def hint_text(self, node_id, current_state, ending=None):
+        """A one-line hint for the in-game hint command."""
+        ending = self._ending(ending)
+        if ending is None:
+            return "Hint: this story has no ending to aim for."
+        best = self.hint(node_id, current_state, ending)
+        if best is None:
+            if self.distance(node_id, current_state, ending) == 0:
+                return f"Hint: you're already at {ending}."
+            return f"Hint: {ending} can't be reached from here."
+        position, steps = best
+        move = "carry on" if position is None else f"choose {position + 1}"
+        return f"Hint: {move} ({steps} step{'s' if steps != 1 else ''} to {ending})."
@@ -0,0 +1,104 @@
+"""
+Headless runner for scripted and policy-driven playthroughs.
+
+Plays the story without touching the terminal, so QA and balancing runs
+can push many games through the engine at machine speed.
+"""
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import simple_game
+
+# Outcome of a single playthrough.
+# path: node ids visited in order, ending: last node visited,
+# outcome: "quit", "restart", "exhausted" (script ran out), "max_steps" or "missing" (dangling node id)
+RunResult = namedtuple("RunResult", ["path", "ending", "outcome", "state", "player"])
+
+def random_policy(node, choices, current_state):
+    """Picks a random available choice; answers text prompts with the default name."""
+    if node.get("input_prompt"):
+        return ""
+    if not choices:
+        return "q"
+    return str(random.randrange(len(choices)) + 1) # Same draws as randint(1, n), one call fewer
+
+def _script_policy(script):
+    """Turns an iterable of raw inputs (as typed at the prompt) into a policy."""
+    inputs = iter(script)
+    return lambda node, choices, current_state: next(inputs)
+
+def play(script, story=None, start="intro", max_steps=1000):
+    """
+    Plays one game from start without any terminal I/O.
+    script is either an iterable of raw inputs, exactly as a player would type them,
+    or a policy callable policy(node, available_choices, state) returning the next raw input.
+    Invalid inputs are skipped, just like the interactive prompt re-asks, but they count
+    towards max_steps, so a policy that never gives a valid input still stops.
+    """
+    story = story or simple_game.registry
+    policy = script if callable(script) else _script_policy(script)
+    session_state, session_player = {}, {"name": "Wanderer"}
+    path = []
+    node_id = start
+    outcome = "max_steps"
+    inputs_left = max_steps
+
+    with simple_game.bound_session(session_state, session_player):
+        while inputs_left:
+            if node_id not in story:
+                outcome = "missing"
+                break
+            path.append(node_id)
+            node, choices = story.choices(node_id, session_state)
+
+            try:
+                error = True
+                while error and inputs_left:
+                    inputs_left -= 1
+                    user_input = policy(node, choices, session_state)
+                    next_node_id, chosen_option, error = simple_game.resolve_input(node, choices, user_input)
+            except StopIteration:
+                outcome = "exhausted"
+                break
+            if error:
+                break # Out of steps while the policy kept giving invalid input
+
+            simple_game.apply_input(node, chosen_option, user_input, story)
+            if next_node_id in simple_game.TERMINALS:
+                outcome = next_node_id
+                break
+            node_id = next_node_id
+
+    return RunResult(path, path[-1] if path else None, outcome, session_state, session_player)
+
+# --- Batch Runs ---
+
+_worker_story = None
+
+def _init_worker(story_factory):
+    """Builds the story registry once per worker process."""
+    global _worker_story
+    _worker_story = simple_game.StoryRegistry(story_factory()) if story_factory else simple_game.registry
+
+def _play_chunk(scripts, start, max_steps):
+    return [play(script, _worker_story, start, max_steps) for script in scripts]
+
+def run_batch(scripts, story_factory=None, processes=None, chunksize=512, start="intro", max_steps=1000):
+    """
+    Plays many games and returns their RunResults in the order of scripts.
+    story_factory is a zero-argument function returning node functions (default: get_text_nodes).
+    Runs are spread over a process pool; story_factory and any policies must then be
+    module-level functions so they can be sent to the workers.
+    """
+    scripts = list(scripts)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(scripts) <= chunksize:
+        story = simple_game.StoryRegistry(story_factory()) if story_factory else simple_game.registry
+        return [play(script, story, start, max_steps) for script in scripts]
+
+    chunks = [scripts[i:i + chunksize] for i in range(0, len(scripts), chunksize)]
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(story_factory,)) as pool:
+        results = pool.map(_play_chunk, chunks, [start] * len(chunks), [max_steps] * len(chunks))
+        return [result for chunk in results for result in chunk]
@@ -0,0 +1,308 @@
+"""
+Back/undo history built from persistent, structurally shared snapshots.
+
+state and player are stored as PMaps, hash array mapped tries that are never
+changed in place: setting a key copies only the path to it, so a step that
+leaves a dict alone reuses the previous snapshot outright and a set_state
+costs a handful of small nodes rather than a dict copy. Steps form a tree
+(going back and choosing differently starts a branch) and carry skew-binary
+jump pointers, so reaching the step N moves back is O(log N).
+"""
+from collections.abc import Mapping
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_HASH_BITS = 64
+_MISSING = object()
+
+# --- Persistent Maps ---
+
+class _Node:
+    """A trie level: bitmap of occupied slots and their entries (a _Node, a (key, value) pair or a _Collision)."""
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+class _Collision:
+    """Keys whose full hashes are equal."""
+
+    __slots__ = ("pairs",)
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+_EMPTY_NODE = _Node(0, ())
+
+def _hash(key):
+    return hash(key) & ((1 << _HASH_BITS) - 1)
+
+def _slot(bitmap, bit):
+    return bin(bitmap & (bit - 1)).count("1")
+
+def _merge(shift, first, first_hash, second, second_hash):
+    """A node holding two pairs that share a slot at the level above."""
+    if shift >= _HASH_BITS:
+        return _Collision((first, second))
+    first_bit = 1 << ((first_hash >> shift) & (_WIDTH - 1))
+    second_bit = 1 << ((second_hash >> shift) & (_WIDTH - 1))
+    if first_bit == second_bit:
+        return _Node(first_bit, (_merge(shift + _BITS, first, first_hash, second, second_hash),))
+    entries = (first, second) if first_bit < second_bit else (second, first)
+    return _Node(first_bit | second_bit, entries)
+
+def _assoc(node, shift, key_hash, key, value):
+    """Returns (new node, whether a key was added); node itself is left untouched."""
+    if type(node) is _Collision:
+        pairs = [pair for pair in node.pairs if pair[0] != key]
+        return _Collision(tuple(pairs) + ((key, value),)), len(pairs) == len(node.pairs)
+
+    bit = 1 << ((key_hash >> shift) & (_WIDTH - 1))
+    position = _slot(node.bitmap, bit)
+    entries = node.entries
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, entries[:position] + ((key, value),) + entries[position:]), True
+
+    entry = entries[position]
+    if type(entry) is tuple:
+        if entry[0] == key:
+            if entry[1] is value:
+                return node, False
+            replacement, added = (key, value), False
+        else:
+            replacement = _merge(shift + _BITS, entry, _hash(entry[0]), (key, value), key_hash)
+            added = True
+    else:
+        replacement, added = _assoc(entry, shift + _BITS, key_hash, key, value)
+        if replacement is entry:
+            return node, False
+    return _Node(node.bitmap, entries[:position] + (replacement,) + entries[position + 1:]), added
+
+def _lookup(node, key_hash, key):
+    shift = 0
+    while True:
+        if type(node) is _Collision:
+            for pair in node.pairs:
+                if pair[0] == key:
+                    return pair[1]
+            return _MISSING
+        bit = 1 << ((key_hash >> shift) & (_WIDTH - 1))
+        if not node.bitmap & bit:
+            return _MISSING
+        entry = node.entries[_slot(node.bitmap, bit)]
+        if type(entry) is tuple:
+            return entry[1] if entry[0] == key else _MISSING
+        node = entry
+        shift += _BITS
+
+def _pairs(entry):
+    if type(entry) is tuple:
+        yield entry
+    elif type(entry) is _Collision:
+        yield from entry.pairs
+    else:
+        for child in entry.entries:
+            yield from _pairs(child)
+
+def _diff(first, second, changes):
+    """Adds {key: (first value, second value)} for keys that differ, skipping subtrees the two maps share."""
+    if first is second:
+        return
+    if type(first) is _Node and type(second) is _Node:
+        for index in range(_WIDTH):
+            bit = 1 << index
+            left = first.entries[_slot(first.bitmap, bit)] if first.bitmap & bit else None
+            right = second.entries[_slot(second.bitmap, bit)] if second.bitmap & bit else None
+            if left is not None and right is not None:
+                _diff(left, right, changes)
+            elif left is not None or right is not None:
+                _diff_pairs(_pairs(left) if left is not None else (), _pairs(right) if right is not None else (), changes)
+        return
+    _diff_pairs(_pairs(first), _pairs(second), changes)
+
+def _diff_pairs(first, second, changes):
+    left, right = dict(first), dict(second)
+    for key in left.keys() | right.keys():
+        before, after = left.get(key, _MISSING), right.get(key, _MISSING)
+        if before is _MISSING or after is _MISSING or before != after:
+            changes[key] = (None if before is _MISSING else before, None if after is _MISSING else after)
+
+class PMap(Mapping):
+    """An immutable mapping; set() and update() return new maps sharing structure with the old one."""
+
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, items=()):
+        root, size = _EMPTY_NODE, 0
+        for key, value in dict(items).items():
+            root, added = _assoc(root, 0, _hash(key), key, value)
+            size += added
+        self._root, self._size = root, size
+
+    @classmethod
+    def _make(cls, root, size):
+        new = cls.__new__(cls)
+        new._root, new._size = root, size
+        return new
+
+    def set(self, key, value):
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        return self if root is self._root else PMap._make(root, self._size + added)
+
+    def update(self, items):
+        updated = self
+        for key, value in items.items():
+            updated = updated.set(key, value)
+        return updated
+
+    def __getitem__(self, key):
+        value = _lookup(self._root, _hash(key), key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = _lookup(self._root, _hash(key), key)
+        return default if value is _MISSING else value
+
+    def __contains__(self, key):
+        return _lookup(self._root, _hash(key), key) is not _MISSING
+
+    def __iter__(self):
+        for key, _ in _pairs(self._root):
+            yield key
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return f"PMap({dict(self)!r})"
+
+    def diff(self, other):
+        """Returns {key: (value here, value in other)} for every key that differs (None when missing)."""
+        changes = {}
+        _diff(self._root, other._root, changes)
+        return changes
+
+def snapshot(previous, live):
+    """
+    Returns a PMap equal to the live dict, built from previous by setting only the changed keys;
+    previous itself comes back when nothing changed.
+    """
+    updated = previous
+    for key, value in live.items():
+        if updated.get(key, _MISSING) != value:
+            updated = updated.set(key, value)
+    if len(updated) != len(live): # Keys were removed, e.g. by a restart
+        return PMap(live)
+    return updated
+
+# --- History ---
+
+class Step:
+    """One point in the history: the node entered and the state and player on entering it."""
+
+    __slots__ = ("node_id", "state", "player", "parent", "jump", "depth")
+
+    def __init__(self, node_id, state, player, parent=None):
+        self.node_id = node_id
+        self.state = state
+        self.player = player
+        self.parent = parent
+        if parent is None:
+            self.depth, self.jump = 0, self
+        else:
+            self.depth = parent.depth + 1
+            jump = parent.jump
+            # Skew-binary jump pointers: any ancestor is reached in O(log depth) hops
+            self.jump = jump.jump if parent.depth - jump.depth == jump.depth - jump.jump.depth else parent
+
+    def ancestor(self, depth):
+        """The step on the way here at the given depth."""
+        if not 0 <= depth <= self.depth:
+            raise ValueError(f"no ancestor at depth {depth}")
+        step = self
+        while step.depth > depth:
+            step = step.jump if step.jump.depth >= depth else step.parent
+        return step
+
+    def path(self, since=None):
+        """Node IDs from since (exclusive; default the root, inclusive) to this step."""
+        node_ids = []
+        step = self
+        while step is not None and step is not since:
+            node_ids.append(step.node_id)
+            step = step.parent
+        return node_ids[::-1]
+
+def common_ancestor(first, second):
+    """The deepest step that both first and second descend from (or are)."""
+    if first.depth > second.depth:
+        first = first.ancestor(second.depth)
+    elif second.depth > first.depth:
+        second = second.ancestor(first.depth)
+    while first is not second:
+        if first.jump is not second.jump:
+            first, second = first.jump, second.jump
+        else:
+            first, second = first.parent, second.parent
+    return first
+
+class History:
+    """
+    The steps of one game round. record() adds a step after the current one,
+    back() moves the cursor without forgetting anything, so the steps that were
+    undone stay available as a branch to go forward() to again or compare against.
+    """
+
+    def __init__(self, node_id="intro", state=None, player=None):
+        self.start(node_id, state or {}, player or {})
+
+    def start(self, node_id, state, player):
+        """Forgets everything and starts over at node_id."""
+        self.current = Step(node_id, PMap(state), PMap(player))
+        self._tips = {self.current: None} # Steps nothing was recorded after, oldest first
+
+    def record(self, node_id, state, player):
+        """Adds a step for entering node_id with the given state and player dicts."""
+        parent = self.current
+        self.current = Step(node_id, snapshot(parent.state, state), snapshot(parent.player, player), parent)
+        self._tips.pop(parent, None)
+        self._tips[self.current] = None
+        return self.current
+
+    def can_go_back(self, steps=1):
+        return self.current.depth >= steps
+
+    def back(self, steps=1):
+        """Moves the cursor steps back and returns that step."""
+        self.current = self.current.ancestor(self.current.depth - steps)
+        return self.current
+
+    def forward(self, steps=1):
+        """Redoes steps along the most recently recorded branch after the cursor; returns the step, or None."""
+        for tip in reversed(self._tips):
+            if tip.depth >= self.current.depth + steps and tip.ancestor(self.current.depth) is self.current:
+                self.current = tip.ancestor(self.current.depth + steps)
+                return self.current
+        return None
+
+    def branches(self):
+        """The last step of every branch, oldest first."""
+        return list(self._tips)
+
+    def compare(self, first, second):
+        """
+        Describes how two steps differ: the node IDs each took since their common ancestor,
+        and {key: (first value, second value)} for state and player.
+        """
+        fork = common_ancestor(first, second)
+        return {
+            "fork": fork.node_id,
+            "first": first.path(fork),
+            "second": second.path(fork),
+            "state": first.state.diff(second.state),
+            "player": first.player.diff(second.player),
+        }
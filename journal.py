@@ -0,0 +1,140 @@
+"""
+Append-only save journal with periodic checkpoints.
+
+Every transition is appended to the journal as one JSON line. Every
+checkpoint_every transitions the full state is written to a checkpoint file
+together with the journal offset it covers, so resuming only replays the tail.
+Records are written in batches and fsync'd on a configurable schedule.
+"""
+import json
+import os
+
+import simple_game
+
+class Journal:
+    """
+    Records transitions for one save slot at path (the checkpoint lives at path + ".checkpoint").
+    batch_size: transitions buffered before a write.
+    fsync_every: writes between fsyncs; 0 means only at checkpoints and close.
+    """
+
+    def __init__(self, path, checkpoint_every=100, batch_size=16, fsync_every=1):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.checkpoint_every = checkpoint_every
+        self.batch_size = batch_size
+        self.fsync_every = fsync_every
+        self._file = open(path, "ab")
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write(b"\n") # Seal a record torn by a crash so it cannot swallow the next one
+        self._pending = []
+        self._writes = 0
+        self._since_checkpoint = 0
+
+    def record(self, node_id, next_node_id, choice=None, delta=None, text=None, state=None, player=None):
+        """
+        Appends one transition: the node left, the node entered, the chosen choice index,
+        its set_state delta and any text input. With state and player given, a checkpoint
+        is written once checkpoint_every transitions have piled up.
+        """
+        entry = {"node": node_id, "next": next_node_id}
+        if choice is not None:
+            entry["choice"] = choice
+        if delta:
+            entry["delta"] = delta
+        if text is not None:
+            entry["text"] = text
+        self._pending.append(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._since_checkpoint += 1
+
+        if state is not None and self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint(next_node_id, state, player)
+        elif len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self, sync=False):
+        """Writes buffered records; fsyncs when sync is set or the fsync schedule says so."""
+        if self._pending:
+            self._file.write(b"".join(self._pending))
+            self._pending.clear()
+            self._writes += 1
+        self._file.flush()
+        if sync or (self.fsync_every and self._writes % self.fsync_every == 0):
+            os.fsync(self._file.fileno())
+
+    def checkpoint(self, node_id, state, player):
+        """Writes the full session and the journal offset it covers, atomically."""
+        self.flush(sync=True)
+        snapshot = {"node": node_id, "state": state, "player": player, "offset": self._file.tell()}
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as out:
+            json.dump(snapshot, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+        self._since_checkpoint = 0
+
+    def close(self):
+        self.flush(sync=True)
+        self._file.close()
+
+    def resume(self, story=None):
+        """
+        Rebuilds the saved session from the latest checkpoint plus the journal tail.
+        Returns (node_id, state, player), or None if there is nothing to resume.
+        """
+        self.flush()
+        return resume(self.path, story)
+
+def _ends_with_newline(path):
+    with open(path, "rb") as log:
+        log.seek(-1, os.SEEK_END)
+        return log.read(1) == b"\n"
+
+def resume(path, story=None):
+    """Rebuilds (node_id, state, player) from a journal, or returns None if it holds no game in progress."""
+    story = story or simple_game.registry
+    node_id, state, player, offset = "intro", {}, {"name": "Wanderer"}, 0
+    started = False
+    try:
+        with open(path + ".checkpoint", encoding="utf-8") as checkpoint:
+            snapshot = json.load(checkpoint)
+        node_id, state, player, offset = snapshot["node"], snapshot["state"], snapshot["player"], snapshot["offset"]
+        started = True
+    except FileNotFoundError:
+        pass
+
+    try:
+        with open(path, "rb") as log:
+            log.seek(offset)
+            tail = log.read()
+    except FileNotFoundError:
+        tail = b""
+
+    finished = node_id == "quit"
+    with simple_game.bound_session(state, player):
+        for line in tail.split(b"\n"):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue # Blank line or a record cut short by a crash
+            started = True
+            if finished: # Records after a quit belong to a new game
+                state.clear()
+                player.clear()
+                player["name"] = "Wanderer"
+            if "text" in entry:
+                node = story.get(entry["node"])
+                simple_game.apply_input(node, None, entry["text"], story)
+            state.update(entry.get("delta", {}))
+            node_id = entry["next"]
+            finished = node_id == "quit"
+            if node_id == "restart":
+                state.clear()
+                player.clear()
+                player["name"] = "Wanderer"
+                node_id = "intro"
+
+    if not started or finished:
+        return None
+    return node_id, state, player
@@ -0,0 +1,154 @@
+"""
+Opt-in instrumentation for the game loop.
+
+Set simple_game.metrics to a Metrics instance (or run with --metrics PATH) and
+the engine times its phases, keeps a latency histogram per node and counts
+choice selections and set_state mutations. While simple_game.metrics is None
+each hook costs one global lookup.
+
+Phases:
+    build    running a node function and compiling it (cache misses only)
+    guards   checking required_state for a node's choices
+    render   formatting a frame's text and choices
+    present  writing the frame to the terminal; frames clear the screen as part of this
+             single write, so in the game loop clearing is counted here
+    clear    explicit clear_screen() calls (the game loop makes none)
+    input    waiting for the player
+
+Snapshots are Prometheus text, or JSON when the output path ends in ".json".
+"""
+import atexit
+import bisect
+import json
+from collections import Counter
+from time import perf_counter
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram:
+    """Counts observations (seconds) into the fixed BUCKETS, Prometheus style."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """Yields (upper bound label, observations <= bound) for every bucket."""
+        running = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            running += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), running
+
+    def as_dict(self):
+        return {"count": self.count, "sum": self.total, "buckets": dict(self.cumulative())}
+
+class Metrics:
+    """Phase timings, per-node latency and counters for one game process."""
+
+    def __init__(self):
+        self.phases = {} # phase -> Histogram
+        self.nodes = {} # node_id -> Histogram of handling time, input waits excluded
+        self.choices = Counter() # (node_id, choice text) -> selections
+        self.set_state = Counter() # state key -> writes
+
+    def observe(self, phase, seconds):
+        histogram = self.phases.get(phase)
+        if histogram is None:
+            histogram = self.phases[phase] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_node(self, node_id, seconds):
+        histogram = self.nodes.get(node_id)
+        if histogram is None:
+            histogram = self.nodes[node_id] = Histogram()
+        histogram.observe(seconds)
+
+    def count_choice(self, node_id, choice):
+        self.choices[node_id, choice["text"]] += 1
+
+    def count_set_state(self, keys):
+        self.set_state.update(keys)
+
+    def time_node(self, node_id, show, read):
+        """
+        Calls show(read) with read wrapped so waits for input are timed as the "input" phase,
+        and records the rest of the call as node_id's latency.
+        """
+        waited = 0.0
+        def timed_read(prompt):
+            nonlocal waited
+            started = perf_counter()
+            try:
+                return read(prompt)
+            finally:
+                elapsed = perf_counter() - started
+                waited += elapsed
+                self.observe("input", elapsed)
+
+        started = perf_counter()
+        try:
+            return show(timed_read)
+        finally:
+            self.observe_node(node_id, perf_counter() - started - waited)
+
+    # --- Export ---
+
+    def to_dict(self):
+        return {
+            "phases": {phase: histogram.as_dict() for phase, histogram in sorted(self.phases.items())},
+            "nodes": {node_id: histogram.as_dict() for node_id, histogram in sorted(self.nodes.items())},
+            "choices": [
+                {"node": node_id, "choice": text, "count": count}
+                for (node_id, text), count in sorted(self.choices.items())
+            ],
+            "set_state": dict(sorted(self.set_state.items())),
+        }
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        def histogram(name, help_text, label, histograms):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for value, data in sorted(histograms.items()):
+                labels = f'{label}="{_escape(value)}"'
+                for bound, count in data.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {data.total!r}")
+                lines.append(f"{name}_count{{{labels}}} {data.count}")
+
+        histogram("simple_game_phase_seconds", "Time spent in each phase of the game loop.", "phase", self.phases)
+        histogram("simple_game_node_seconds", "Time spent handling each node, excluding waits for input.", "node", self.nodes)
+        lines.append("# HELP simple_game_choice_selections_total Choices picked by the player.")
+        lines.append("# TYPE simple_game_choice_selections_total counter")
+        for (node_id, text), count in sorted(self.choices.items()):
+            lines.append(f'simple_game_choice_selections_total{{node="{_escape(node_id)}",choice="{_escape(text)}"}} {count}')
+        lines.append("# HELP simple_game_set_state_total Writes to each state key by set_state.")
+        lines.append("# TYPE simple_game_set_state_total counter")
+        for key, count in sorted(self.set_state.items()):
+            lines.append(f'simple_game_set_state_total{{key="{_escape(key)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes a snapshot to path: JSON if it ends in ".json", Prometheus text otherwise."""
+        with open(path, "w", encoding="utf-8") as out:
+            if path.endswith(".json"):
+                json.dump(self.to_dict(), out, indent=2)
+            else:
+                out.write(self.to_prometheus())
+
+    def write_on_exit(self, path):
+        """Writes a snapshot to path when the interpreter exits."""
+        atexit.register(self.write, path)
+        return self
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,146 @@
+"""
+Monte Carlo estimate of how random or weighted players spread over a story's endings.
+
+The (node, flag-state) graph from explore.Explorer is turned into a sparse
+transition matrix, then millions of simulated players are advanced together
+with NumPy array operations instead of one show_text_node call at a time.
+Reports ending probabilities, step-count histograms and per-node visit rates.
+
+Requires NumPy (pip install numpy).
+"""
+import argparse
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency, only this module needs it
+    np = None
+
+import explore
+import simple_game
+
+# endings: {ending: probability}; an ending is (node_id, "quit" | "restart") for the node the player
+#          left the game from and how, or the id of a dangling next_text target the player got stuck on
+# unfinished: probability of still playing after max_steps
+# steps: {ending: array where steps[ending][n] is the probability of finishing there after n moves}
+# visits: {node_id: mean visits per player}
+EndingDistribution = namedtuple("EndingDistribution", ["players", "endings", "unfinished", "steps", "visits"])
+
+class TransitionModel:
+    """
+    Transition matrix over the reachable (node, state) pairs of a story, in CSR form.
+    weight(node_id, choice_position) gives the relative chance of picking a choice
+    (default: every available choice is equally likely).
+    """
+
+    def __init__(self, story=None, start="intro", weight=None):
+        if np is None:
+            raise ImportError("The Monte Carlo estimator needs NumPy: pip install numpy")
+        edges = explore.Explorer(story).explore(start).edges
+        pairs = [pair for pair, out in edges.items() if out]
+        index = {pair: i for i, pair in enumerate(pairs)}
+        self.node_ids = sorted({node_id for node_id, _ in pairs})
+        node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+        self.ending_ids = []
+        ending_index = {}
+        def absorbing(label):
+            if label not in ending_index:
+                ending_index[label] = len(self.ending_ids)
+                self.ending_ids.append(label)
+            return len(pairs) + ending_index[label]
+
+        indptr = [0]
+        targets = []
+        probabilities = []
+        for pair in pairs:
+            node_id = pair[0]
+            row = []
+            for position, target in edges[pair]:
+                if edges.get(target):
+                    column = index[target]
+                else: # Leaving the game (quit/restart) or a dangling target
+                    column = absorbing((node_id, target[0]) if target[0] in simple_game.TERMINALS else target[0])
+                row.append((column, weight(node_id, position) if weight else 1.0))
+            total = sum(w for _, w in row)
+            for column, w in row:
+                targets.append(column)
+                probabilities.append(w / total if total > 0 else 1.0 / len(row))
+            indptr.append(len(targets))
+
+        self.states = len(pairs)
+        self.start = index[(start, explore.canonical_state({}))]
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)
+        self.node_of_state = np.asarray([node_index[node_id] for node_id, _ in pairs], dtype=np.int64)
+
+        # Sampling keys: row r's choices cover (r, r + 1] in cumulative order, so one
+        # searchsorted over all rows picks the next state for every player at once
+        row_sizes = np.diff(self.indptr)
+        cumulative = np.cumsum(self.probabilities)
+        row_base = np.concatenate(([0.0], cumulative[self.indptr[1:-1] - 1]))
+        self._keys = np.repeat(np.arange(self.states), row_sizes) + cumulative - np.repeat(row_base, row_sizes)
+        self._keys[self.indptr[1:] - 1] = np.arange(1, self.states + 1) # Exact row ends despite rounding
+
+    def simulate(self, players=1_000_000, max_steps=1000, seed=None, batch_size=1_000_000):
+        """Advances players in batches and returns an EndingDistribution."""
+        rng = np.random.default_rng(seed)
+        ending_counts = np.zeros(len(self.ending_ids), dtype=np.int64)
+        step_counts = np.zeros((len(self.ending_ids), max_steps + 1), dtype=np.int64)
+        visit_counts = np.zeros(len(self.node_ids), dtype=np.int64)
+        unfinished = 0
+
+        for offset in range(0, players, batch_size):
+            size = min(batch_size, players - offset)
+            position = np.full(size, self.start, dtype=np.int64)
+            visit_counts[self.node_of_state[self.start]] += size
+            alive = np.arange(size)
+            for step in range(1, max_steps + 1):
+                keys = position[alive] + rng.random(alive.size)
+                moved = self.targets[np.searchsorted(self._keys, keys, side="right")]
+                finished = moved >= self.states
+                if finished.any():
+                    endings = moved[finished] - self.states
+                    ending_counts += np.bincount(endings, minlength=len(self.ending_ids))
+                    step_counts[:, step] += np.bincount(endings, minlength=len(self.ending_ids))
+                still_playing = moved[~finished]
+                visit_counts += np.bincount(self.node_of_state[still_playing], minlength=len(self.node_ids))
+                position[alive[~finished]] = still_playing
+                alive = alive[~finished]
+                if not alive.size:
+                    break
+            unfinished += alive.size
+
+        return EndingDistribution(
+            players=players,
+            endings={ending: float(count / players) for ending, count in zip(self.ending_ids, ending_counts)},
+            unfinished=float(unfinished / players),
+            steps={ending: step_counts[i] / players for i, ending in enumerate(self.ending_ids)},
+            visits={node_id: float(count / players) for node_id, count in zip(self.node_ids, visit_counts)},
+        )
+
+def estimate(story=None, players=1_000_000, max_steps=1000, seed=None, weight=None):
+    """Builds a TransitionModel for story and simulates players through it."""
+    return TransitionModel(story, weight=weight).simulate(players, max_steps, seed)
+
+def print_distribution(distribution):
+    """Prints ending probabilities, mean steps and visit rates."""
+    print(f"Simulated players: {distribution.players}")
+    for ending, probability in sorted(distribution.endings.items(), key=lambda item: -item[1]):
+        histogram = distribution.steps[ending]
+        mean_steps = (histogram * np.arange(histogram.size)).sum() / probability if probability else 0.0
+        label = f"{ending[0]} ({ending[1]})" if isinstance(ending, tuple) else ending
+        print(f"  {label:24} {probability:8.2%}  mean steps {mean_steps:.1f}")
+    print(f"  {'(unfinished)':24} {distribution.unfinished:8.2%}")
+    print("Mean visits per player:")
+    for node_id, visits in sorted(distribution.visits.items(), key=lambda item: -item[1]):
+        print(f"  {node_id:20} {visits:.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate how random players spread over the story's endings.")
+    parser.add_argument("--players", type=int, default=1_000_000)
+    parser.add_argument("--max-steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    print_distribution(estimate(players=args.players, max_steps=args.max_steps, seed=args.seed))
@@ -0,0 +1,160 @@
+"""
+Asyncio line-protocol server that hosts many players at once.
+
+Each connection gets its own state and player dicts and is driven through
+simple_game.step, so no session ever blocks on input(). Connect with any
+line-based client, e.g. `nc localhost 4000`.
+"""
+import argparse
+import asyncio
+import time
+
+import simple_game
+
+class LatencyStats:
+    """Counts step latencies into fixed millisecond buckets."""
+
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, float("inf"))
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(self.BUCKETS_MS)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        milliseconds = seconds * 1000
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if milliseconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "buckets_ms": {str(bound): n for bound, n in zip(self.BUCKETS_MS, self.buckets)},
+        }
+
+class Session:
+    """One player's game: isolated state, player and current node."""
+
+    def __init__(self, story=None, start="intro"):
+        self.story = story or simple_game.registry
+        self.start = start
+        self.latency = LatencyStats()
+        self.reset()
+
+    def reset(self):
+        self.state = {}
+        self.player = {"name": "Wanderer"}
+        self.node_id = self.start
+
+    def frame(self):
+        """Returns the current node's frame followed by its prompt."""
+        with simple_game.bound_session(self.state, self.player):
+            node = self.story.get(self.node_id)
+            lines = simple_game.frame_lines(self.node_id, self.story)
+        return "\n".join(lines) + "\n" + (node.get("input_prompt") or "> ")
+
+    def handle(self, line):
+        """Handles one input line. Returns (reply, finished)."""
+        with simple_game.bound_session(self.state, self.player):
+            next_node_id, _, error = simple_game.step(self.node_id, line, self.story)
+        if error:
+            return error + "\n> ", False
+        if next_node_id == "quit":
+            return "\nThanks for playing!\n", True
+        if next_node_id == "restart":
+            self.reset()
+            return "\nRestarting game...\n" + self.frame(), False
+        if next_node_id not in self.story:
+            return "A problem occurred. Exiting game.\n", True
+        self.node_id = next_node_id
+        return self.frame(), False
+
+class GameServer:
+    """Accepts TCP connections and runs one Session per connection."""
+
+    def __init__(self, host="127.0.0.1", port=0, story=None):
+        self.host = host
+        self.port = port
+        self.story = story or simple_game.registry
+        self.connections_total = 0
+        self.sessions = set()
+        self.latency = LatencyStats() # Across all sessions
+        self._server = None
+
+    async def start(self):
+        """Starts listening; with port 0 the chosen port is stored in self.port."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def stats(self):
+        """Returns connection counters and step latencies, overall and per active session."""
+        return {
+            "connections_total": self.connections_total,
+            "connections_active": len(self.sessions),
+            "latency": self.latency.as_dict(),
+            "sessions": [session.latency.as_dict() for session in self.sessions],
+        }
+
+    async def _handle(self, reader, writer):
+        session = Session(self.story)
+        self.connections_total += 1
+        self.sessions.add(session)
+        try:
+            writer.write(session.frame().encode())
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                started = time.perf_counter()
+                reply, finished = session.handle(line.decode(errors="replace").rstrip("\r\n"))
+                elapsed = time.perf_counter() - started
+                session.latency.record(elapsed)
+                self.latency.record(elapsed)
+                writer.write(reply.encode())
+                await writer.drain()
+                if finished:
+                    break
+        except ConnectionError:
+            pass # Client went away mid-write
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass # Already reset by the client
+
+async def _serve(host, port):
+    server = GameServer(host, port)
+    await server.start()
+    print(f"Serving The Simple Choice on {server.host}:{server.port}")
+    try:
+        await server.serve_forever()
+    finally:
+        print(server.stats())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host The Simple Choice for many players over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -1,5 +1,113 @@
+import time
+_import_started = time.perf_counter() # For --startup-profile
 import sys
 import os
+import operator
+# re and argparse are imported where they are needed: together they cost more than the rest of start-up.
+# functools and contextlib are left out too, since they pull in collections.
+
+# --- Text Templates ---
+
+_TEMPLATE_TOKEN = r"\{\{|\}\}|\{([^{}]*)\}"
+
+def _same_values(first, second):
+    """Whether two lists of field values match for caching: 1, 1.0 and True are equal but print differently."""
+    return len(first) == len(second) and all(
+        a is b or (type(a) is type(b) and a == b) for a, b in zip(first, second)
+    )
+
+class Template:
+    """
+    Node text that is parsed once and re-rendered only when a field it uses changes.
+    Placeholders:
+        {player.name}, {state.hasKey}                 insert a field ("" if missing)
+        {if state.hasKey}...{else}...{end}            pick a branch on a field's truthiness
+        {if not state.hasKey}...{end}                 negated test
+        {{ and }}                                     literal braces
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._parts, fields = _parse_template(source)
+        self.fields = tuple(sorted(fields)) # (source, key) pairs, e.g. ("player", "name")
+        self._cached_values = None
+        self._cached_text = None
+
+    def render(self, current_state=None, current_player=None):
+        """Returns the text for the given (default: module-level) state and player."""
+        sources = {
+            "state": state if current_state is None else current_state,
+            "player": player if current_player is None else current_player,
+        }
+        values = [sources[source].get(key, _MISSING) for source, key in self.fields]
+        if self._cached_values is None or not _same_values(values, self._cached_values):
+            lookup = dict(zip(self.fields, values))
+            self._cached_text = "".join(_render_parts(self._parts, lookup))
+            self._cached_values = values
+        return self._cached_text
+
+    def __repr__(self):
+        return f"Template({self.source!r})"
+
+def _parse_field(name, source):
+    origin, _, key = name.strip().partition(".")
+    if origin not in ("state", "player") or not key:
+        raise ValueError(f"Bad template field '{name}' in {source!r}")
+    return origin, key
+
+def _parse_template(source):
+    """Returns (parts, fields); parts are strings, ("field", field) or ("if", field, negate, then, else)."""
+    if "{" not in source and "}" not in source:
+        return [source], set() # Plain text, e.g. most story file nodes: no need for re
+    import re
+    fields = set()
+    root = []
+    stack = [] # Open {if} blocks: (parts to resume, if-part)
+    parts = root
+    position = 0
+    for match in re.finditer(_TEMPLATE_TOKEN, source):
+        parts.append(source[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        if token in ("{{", "}}"):
+            parts.append(token[0])
+            continue
+
+        tag = match.group(1).strip()
+        if tag.startswith("if "):
+            condition = tag[3:].strip()
+            negate = condition.startswith("not ")
+            field = _parse_field(condition[4:] if negate else condition, source)
+            fields.add(field)
+            block = ["if", field, negate, [], []]
+            parts.append(block)
+            stack.append((parts, block))
+            parts = block[3]
+        elif tag == "else" and stack:
+            parts = stack[-1][1][4]
+        elif tag == "end" and stack:
+            parts = stack.pop()[0]
+        else:
+            field = _parse_field(tag, source)
+            fields.add(field)
+            parts.append(("field", field))
+    if stack:
+        raise ValueError(f"Unclosed {{if}} in template {source!r}")
+    parts.append(source[position:])
+    return root, fields
+
+def _render_parts(parts, lookup):
+    for part in parts:
+        if isinstance(part, str):
+            yield part
+        elif part[0] == "field":
+            value = lookup[part[1]]
+            yield "" if value is _MISSING else str(value)
+        else:
+            _, field, negate, then_parts, else_parts = part
+            value = lookup[field]
+            passed = value is not _MISSING and bool(value)
+            yield from _render_parts(then_parts if passed != negate else else_parts, lookup)
 
 # --- Game Data (Translated from JavaScript) ---
 
@@ -7,6 +115,28 @@ import os
 state = {}
 player = {"name": "Wanderer"}
 
+# Text for nodes that depend on state or player, parsed the first time a node renders it
+GREETING_TEXT = (
+    "Hello, **{player.name}**! You find yourself in a room with two doors.\nOne is *red*, the other is *blue*."
+)
+BLUE_ROOM_TEXT = (
+    "{if state.hasKey}You are back in the blue room. It feels cool.\nYou already took the small key."
+    "{else}You enter a room that is entirely blue. It feels cool.\nYou find a small **key**!{end}"
+)
+SECRET_ENDING_TEXT = (
+    "Using the key you found in the blue room, you unlock a hidden panel in the red room!"
+    "\n\n**Congratulations, {player.name}!** You found the secret exit!"
+)
+
+_templates = {} # Source -> Template
+
+def template(source):
+    """Returns the Template for source, parsing it on first use."""
+    parsed = _templates.get(source)
+    if parsed is None:
+        parsed = _templates[source] = Template(source)
+    return parsed
+
 def get_text_nodes():
     """
     Returns a dictionary mapping node IDs to functions that return node data.
@@ -36,7 +166,7 @@ def get_text_nodes():
 
         "greeting": lambda: {
             "id": "greeting",
-            "text": f"Hello, **{player['name']}**! You find yourself in a room with two doors.\nOne is *red*, the other is *blue*.",
+            "text": template(GREETING_TEXT).render(),
             "choices": [
                 {"text": "Open the red door", "next_text": "redRoom"},
                 {"text": "Open the blue door", "next_text": "blueRoom"}
@@ -50,7 +180,7 @@ def get_text_nodes():
                 {"text": "Go back", "next_text": "greeting"},
                 {
                     "text": "Check for secrets (requires key)",
-                    "required_state": lambda current_state: current_state.get("hasKey", False) is True,
+                    "required_state": {"key": "hasKey", "op": "is", "value": True, "default": False},
                     "next_text": "secretEnding"
                 }
             ]
@@ -58,11 +188,7 @@ def get_text_nodes():
 
         "blueRoom": lambda: {
             "id": "blueRoom",
-            "text": (
-                "You are back in the blue room. It feels cool.\nYou already took the small key."
-                if state.get("hasKey") else
-                "You enter a room that is entirely blue. It feels cool.\nYou find a small **key**!"
-            ),
+            "text": template(BLUE_ROOM_TEXT).render(),
             "choices": (
                 [
                     {"text": "Go back", "next_text": "greeting"}
@@ -79,7 +205,7 @@ def get_text_nodes():
 
         "secretEnding": lambda: {
             "id": "secretEnding",
-            "text": f"Using the key you found in the blue room, you unlock a hidden panel in the red room!\n\n**Congratulations, {player['name']}!** You found the secret exit!",
+            "text": template(SECRET_ENDING_TEXT).render(),
             "choices": [
                 {"text": "Play Again?", "next_text": "restart"},
                 {"text": "Quit", "next_text": "quit"}
@@ -93,15 +219,502 @@ def get_text_nodes():
         }
     }
 
+# --- Conditions ---
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "is": operator.is_,
+    "is not": operator.is_not,
+    "in": lambda value, options: value in options,
+}
+
+class Condition:
+    """A compiled required_state guard. Callable like a lambda guard, but knows which state keys it reads."""
+
+    __slots__ = ("keys", "_test")
+
+    def __init__(self, keys, test):
+        self.keys = keys
+        self._test = test
+
+    def __call__(self, current_state):
+        return self._test(current_state)
+
+_compiled_conditions = {} # Frozen spec -> Condition, so each distinct guard is compiled once
+
+def _freeze_spec(spec):
+    if isinstance(spec, dict):
+        return tuple(sorted((key, _freeze_spec(value)) for key, value in spec.items()))
+    if isinstance(spec, (list, tuple)):
+        return tuple(_freeze_spec(item) for item in spec)
+    return type(spec), spec # True == 1 but they must not share a compiled guard
+
+def compile_condition(spec):
+    """
+    Compiles a declarative guard into a Condition. Accepted forms:
+        {"key": "hasKey", "op": "is", "value": True, "default": False}
+            (op defaults to "==", value to True, default is used when the key is missing)
+        {"and": [spec, ...]}, {"or": [spec, ...]}, {"not": spec}
+    """
+    frozen = _freeze_spec(spec)
+    condition = _compiled_conditions.get(frozen)
+    if condition is None:
+        condition = _compiled_conditions[frozen] = _compile(spec)
+    return condition
+
+def _compile(spec):
+    if "and" in spec or "or" in spec:
+        parts = [_compile(part) for part in spec.get("and", spec.get("or"))]
+        combine = all if "and" in spec else any
+        return Condition(frozenset().union(*(part.keys for part in parts)),
+                         lambda current_state: combine(part(current_state) for part in parts))
+    if "not" in spec:
+        inner = _compile(spec["not"])
+        return Condition(inner.keys, lambda current_state: not inner(current_state))
+
+    key, value, default = spec["key"], spec.get("value", True), spec.get("default")
+    compare = _OPERATORS[spec.get("op", "==")]
+    return Condition(frozenset([key]), lambda current_state: compare(current_state.get(key, default), value))
+
+def compile_node(node):
+    """Replaces declarative required_state specs in a node's choices with compiled Conditions."""
+    choices = node.get("choices")
+    if choices and any(isinstance(choice.get("required_state"), dict) for choice in choices):
+        node["choices"] = [
+            dict(choice, required_state=compile_condition(choice["required_state"]))
+            if isinstance(choice.get("required_state"), dict) else choice
+            for choice in choices
+        ]
+    return node
+
+# --- Compiled Story Registry ---
+
+_MISSING = object() # Marks a dependency key that was absent when a node was built
+
+class _TrackingDict(dict):
+    """A dict copy that records which keys are read from it."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = set()
+        self.reads_all = False # Set when the whole dict is iterated
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.reads.add(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self.reads.add(key)
+        return super().__contains__(key)
+
+    def _read_all(self):
+        self.reads_all = True
+
+    def __iter__(self):
+        self._read_all()
+        return super().__iter__()
+
+    def __len__(self):
+        self._read_all()
+        return super().__len__()
+
+    def keys(self):
+        self._read_all()
+        return super().keys()
+
+    def values(self):
+        self._read_all()
+        return super().values()
+
+    def items(self):
+        self._read_all()
+        return super().items()
+
+def _read_values(source, keys):
+    """Returns the current values of the given keys, in order."""
+    return [source.get(key, _MISSING) for key in keys]
+
+def _changed_keys(before, after):
+    """Returns the keys whose values differ between two dicts."""
+    return {key for key in before.keys() | after.keys() if before.get(key, _MISSING) != after.get(key, _MISSING)}
+
+class _Variant:
+    """One built version of a node, with the state and player fields it read and their values at the time."""
+
+    __slots__ = ("state_keys", "player_keys", "values", "node", "availability")
+
+    def __init__(self, state_keys, player_keys, values, node):
+        self.state_keys = state_keys
+        self.player_keys = player_keys
+        self.values = values # (state values, player values), in key order
+        self.node = node
+        self.availability = None # An _Availability once choices() has been asked for
+
+class _Availability:
+    """A variant's available choices and what its guards depend on."""
+
+    __slots__ = ("keys", "values", "results", "choices", "lambda_positions", "positions_by_key")
+
+    def __init__(self, keys, values, results, choices, lambda_positions, positions_by_key):
+        self.keys = keys # State keys read by compiled guards, sorted
+        self.values = values # Their values when the guards were last checked
+        self.results = results # Guard result per choice position
+        self.choices = choices
+        self.lambda_positions = lambda_positions # Positions of guards that are plain callables
+        self.positions_by_key = positions_by_key # key -> positions of the compiled guards reading it
+
+class StoryRegistry:
+    """
+    Hands out story nodes built from a dict of node functions.
+    A node is rebuilt only when the state or player fields it read while being
+    built have values it hasn't been built for; the last few variants of each
+    node are kept, so sessions switching back and forth (or many headless games
+    in a row) keep hitting the cache.
+    Available choices are kept per variant too, with the values of the state keys
+    its compiled guards read: only guards reading a key whose value changed
+    are checked again. Lambda guards can't say what they read, so they are
+    re-run on every call.
+    """
+
+    VARIANTS = 8 # Built versions kept per node
+
+    def __init__(self, factories):
+        self.factories = factories
+        self._cache = {} # node_id -> _Variants, newest first
+        self._dependents = {} # ("state" | "player", key) -> node ids that read it
+
+    def __contains__(self, node_id):
+        return node_id in self.factories
+
+    def get(self, node_id):
+        """Returns the node data for node_id, rebuilding it only if its inputs changed."""
+        return self._variant(node_id).node
+
+    def _variant(self, node_id):
+        for variant in self._cache.get(node_id, ()):
+            if self._built_for_current(variant):
+                return variant
+        return self._build(node_id)
+
+    def _built_for_current(self, variant):
+        """Whether the variant was built for the current values (and types) of the fields it read."""
+        if not (variant.state_keys or variant.player_keys):
+            return True
+        state_values, player_values = variant.values
+        return (
+            _same_values(state_values, _read_values(state, variant.state_keys))
+            and _same_values(player_values, _read_values(player, variant.player_keys))
+        )
+
+    def choices(self, node_id, current_state):
+        """Returns (node, available choices) for node_id, re-checking only guards that may have changed."""
+        variant = self._variant(node_id)
+        if metrics is None:
+            return variant.node, self._available(variant, current_state)
+        started = time.perf_counter()
+        available = self._available(variant, current_state)
+        metrics.observe("guards", time.perf_counter() - started)
+        return variant.node, available
+
+    def _available(self, variant, current_state):
+        entry = variant.availability
+        if entry is None:
+            return self._check_all_guards(variant, current_state)
+
+        positions = entry.lambda_positions
+        if entry.keys:
+            current = _read_values(current_state, entry.keys)
+            for key, before, after in zip(entry.keys, entry.values, current):
+                if before is not after and (type(before) is not type(after) or before != after):
+                    positions = positions | entry.positions_by_key[key]
+            entry.values = current
+        changed = False
+        results = entry.results
+        all_choices = variant.node.get("choices", ())
+        for position in positions:
+            passed = bool(all_choices[position]["required_state"](current_state))
+            if passed != results[position]:
+                results[position] = passed
+                changed = True
+        if changed:
+            entry.choices = [choice for choice, passed in zip(all_choices, results) if passed]
+        return entry.choices
+
+    def _check_all_guards(self, variant, current_state):
+        node = variant.node
+        results = []
+        lambda_positions = set()
+        positions_by_key = {}
+        for position, choice in enumerate(node.get("choices", ())):
+            guard = choice.get("required_state")
+            if guard is None:
+                results.append(True)
+                continue
+            if isinstance(guard, Condition):
+                for key in guard.keys:
+                    positions_by_key.setdefault(key, set()).add(position)
+            else:
+                lambda_positions.add(position)
+            results.append(bool(guard(current_state)))
+        available = [choice for choice, passed in zip(node.get("choices", ()), results) if passed]
+        keys = tuple(sorted(positions_by_key))
+        variant.availability = _Availability(
+            keys, _read_values(current_state, keys), results, available, lambda_positions, positions_by_key
+        )
+        return available
+
+    def invalidate(self, state_keys=(), player_keys=()):
+        """
+        Called after the given keys changed: of the cached variants of nodes reading them that were
+        built for other values, only the newest is kept, since a restart or the back command often
+        brings the old values back. Only frees memory early; get() and choices() check the values
+        they depend on anyway.
+        """
+        affected = set()
+        for source, keys in (("state", state_keys), ("player", player_keys)):
+            for key in keys:
+                affected.update(self._dependents.get((source, key), ()))
+        for node_id in affected:
+            variants = self._cache.get(node_id)
+            if variants is None or len(variants) < 2:
+                continue
+            kept_stale = False
+            kept = []
+            for variant in variants:
+                if self._built_for_current(variant):
+                    kept.append(variant)
+                elif not kept_stale:
+                    kept.append(variant)
+                    kept_stale = True
+            variants[:] = kept
+
+    def clear(self):
+        """Drops every cached node."""
+        self._cache.clear()
+        self._dependents.clear()
+
+    def _build(self, node_id):
+        global state, player
+        real_state, real_player = state, player
+        tracked_state, tracked_player = _TrackingDict(real_state), _TrackingDict(real_player)
+        state, player = tracked_state, tracked_player # Node functions read the module globals
+        started = time.perf_counter() if metrics is not None else None
+        try:
+            node = compile_node(self.factories[node_id]())
+        finally:
+            state, player = real_state, real_player
+        if started is not None:
+            metrics.observe("build", time.perf_counter() - started)
+
+        if tracked_state.reads_all or tracked_player.reads_all:
+            self._cache.pop(node_id, None) # Depends on the whole dict, never cache
+            return _Variant((), (), None, node)
+
+        state_keys, player_keys = tuple(tracked_state.reads), tuple(tracked_player.reads)
+        values = (_read_values(real_state, state_keys), _read_values(real_player, player_keys))
+        variant = _Variant(state_keys, player_keys, values, node)
+        variants = self._cache.setdefault(node_id, [])
+        variants.insert(0, variant)
+        del variants[self.VARIANTS:]
+        for key in state_keys:
+            self._dependents.setdefault(("state", key), set()).add(node_id)
+        for key in player_keys:
+            self._dependents.setdefault(("player", key), set()).add(node_id)
+        return variant
+
+metrics = None # A metrics.Metrics when instrumentation is enabled (--metrics)
+
+# Built once at load time; node functions only run again when their inputs change
+registry = StoryRegistry(get_text_nodes())
+
+def use_story(factories):
+    """Switches the game to another story, given as a mapping of node IDs to node functions."""
+    global registry
+    registry = StoryRegistry(factories)
+    return registry
+
 # --- Game Engine Logic ---
 
+TERMINALS = ("quit", "restart") # next_text values that end a round instead of naming a node
+
+# --- Terminal Rendering ---
+
+CLEAR_SEQUENCE = "\x1b[H\x1b[2J" # Cursor home, then clear the whole screen
+
+_windows_ansi = None # Whether VT processing could be enabled on the Windows console
+
+def _enable_windows_ansi():
+    """Turns on escape sequence handling for the Windows console, once."""
+    global _windows_ansi
+    if _windows_ansi is None:
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.GetStdHandle(-11) # STD_OUTPUT_HANDLE
+            mode = ctypes.c_uint32()
+            _windows_ansi = bool(
+                kernel32.GetConsoleMode(handle, ctypes.byref(mode))
+                and kernel32.SetConsoleMode(handle, mode.value | 0x0004) # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            )
+        except (AttributeError, OSError):
+            _windows_ansi = False
+    return _windows_ansi
+
+def _terminal_size(out):
+    """(columns, lines) of the terminal behind out; honours COLUMNS and LINES like shutil.get_terminal_size."""
+    try:
+        columns, lines = os.get_terminal_size(out.fileno())
+    except (AttributeError, ValueError, OSError): # Not a real terminal
+        columns, lines = 80, 24
+    return int(os.environ.get("COLUMNS") or columns), int(os.environ.get("LINES") or lines)
+
+def supports_ansi(stream):
+    """Returns True if escape sequences written to stream will be interpreted by a terminal."""
+    isatty = getattr(stream, "isatty", None)
+    if isatty is None or not isatty():
+        return False
+    if os.name == 'nt':
+        return _enable_windows_ansi()
+    return os.environ.get("TERM") != "dumb"
+
+class Renderer:
+    """
+    Writes each frame to the terminal with a single buffered write.
+    On ANSI terminals only the lines that changed since the previous frame are redrawn;
+    any other output (pipes, files, test buffers) gets the frame as plain text.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream # None means whatever sys.stdout is at write time
+        self._previous = None # Rows of the last frame drawn with escape sequences
+        self._previous_stream = None
+        self._extra_rows = 0 # Rows written below the last frame (prompts, messages)
+
+    def _target(self):
+        return self.stream or sys.stdout
+
+    def text_mode(self):
+        """Returns the format_text mode that suits the current output."""
+        return "ansi" if supports_ansi(self._target()) else "plain"
+
+    def clear(self):
+        """Clears the screen and forgets the previous frame."""
+        out = self._target()
+        if supports_ansi(out):
+            out.write(CLEAR_SEQUENCE)
+            out.flush()
+        self._previous = None
+
+    def present(self, lines):
+        """Draws a frame made of the given lines."""
+        out = self._target()
+        if not supports_ansi(out):
+            out.write("\n".join(lines) + "\n")
+            out.flush()
+            self._previous = None
+            return
+
+        rows = "\n".join(lines).split("\n")
+        columns, height = _terminal_size(out)
+        previous = self._previous if self._previous_stream is out else None
+        fits = len(rows) + self._extra_rows < height and all(len(row) < columns for row in rows)
+        if previous is None or not fits or len(previous) + self._extra_rows >= height:
+            buffer = CLEAR_SEQUENCE + "\n".join(rows) + "\n"
+        else:
+            # Rewrite changed rows in place, then wipe everything below the new frame
+            parts = [
+                f"\x1b[{i + 1};1H{row}\x1b[K"
+                for i, row in enumerate(rows)
+                if i >= len(previous) or previous[i] != row
+            ]
+            parts.append(f"\x1b[{len(rows) + 1};1H\x1b[J")
+            buffer = "".join(parts)
+
+        out.write(buffer)
+        out.flush()
+        self._previous = rows if fits else None
+        self._previous_stream = out
+        self._extra_rows = 1 # The prompt line that follows every frame
+
+    def message(self, text):
+        """Prints a line below the current frame (e.g. after an invalid choice)."""
+        print(text, file=self._target())
+        self._extra_rows += 2 # The message and the input line that caused it
+
+renderer = Renderer()
+
 def clear_screen():
     """Clears the console screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if metrics is None:
+        renderer.clear()
+        return
+    started = time.perf_counter()
+    renderer.clear()
+    metrics.observe("clear", time.perf_counter() - started)
+
+# --- Text Formatting ---
+
+_MARKUP_TOKEN = r"(\*\*|\*)"
+_MARKUP_STYLES = {"**": ("\x1b[1m", "\x1b[22m"), "*": ("\x1b[3m", "\x1b[23m")} # Bold, italic: (on, off)
+
+def _render_markup(text, mode):
+    """
+    Renders **bold** and *italic* markup in one pass over the text.
+    mode "plain" drops the markers, mode "ansi" turns them into terminal styles.
+    """
+    if mode == "plain":
+        return text.replace("*", "") # Every marker is made of asterisks, so one scan drops them all
+    if "*" not in text:
+        return text
+
+    import re
+    pieces = re.split(_MARKUP_TOKEN, text) # Text and markers alternate
+    output = []
+    open_styles = set()
+    for i, piece in enumerate(pieces):
+        if i % 2 == 0:
+            output.append(piece)
+        elif piece in open_styles:
+            open_styles.discard(piece)
+            output.append(_MARKUP_STYLES[piece][1])
+        else:
+            open_styles.add(piece)
+            output.append(_MARKUP_STYLES[piece][0])
+    for marker in open_styles: # Unbalanced markers must not leak into the next line
+        output.append(_MARKUP_STYLES[marker][1])
+    return "".join(output)
 
-def format_text(text):
-    """Basic formatting (replace markdown-like tags)."""
-    return text.replace("**", "").replace("*", "")
+_MARKUP_CACHE_SIZE = 1024
+_markup_cache = {} # (text, mode) -> rendered text, least recently used first
+
+def _render_markup_cached(text, mode):
+    """_render_markup behind a bounded LRU cache."""
+    key = (text, mode)
+    rendered = _markup_cache.pop(key, None)
+    if rendered is None:
+        rendered = _render_markup(text, mode)
+        if len(_markup_cache) >= _MARKUP_CACHE_SIZE:
+            del _markup_cache[next(iter(_markup_cache))]
+    _markup_cache[key] = rendered # Re-inserted, so it moves to the most recently used end
+    return rendered
+
+def format_text(text, mode="plain"):
+    """Formats markdown-like tags for display ("plain" or "ansi"); results are kept in a bounded LRU cache."""
+    return _render_markup_cached(text, mode)
+
+def format_texts(texts, mode="plain"):
+    """Formats many strings in one call."""
+    render = _render_markup_cached
+    return [render(text, mode) for text in texts]
 
 def init_game():
     """Initializes the game state."""
@@ -110,103 +723,378 @@ def init_game():
     state = {}
     player = {"name": "Wanderer"} # Reset player name
 
-def show_text_node(node_id):
-    """Displays the text and choices for a given node."""
-    global state # We might modify state via choices
+class bound_session:
+    """Temporarily points the module-level state and player at another session's dicts (use with `with`)."""
 
-    text_nodes = get_text_nodes() # Get the latest node definitions
-    if node_id not in text_nodes:
-        print(f"Error: Node '{node_id}' not found!")
-        return None, None # Indicate error
+    def __init__(self, session_state, session_player):
+        self.session = session_state, session_player
 
-    node_func = text_nodes[node_id]
-    node = node_func() # Execute the function to get the node data
+    def __enter__(self):
+        global state, player
+        self.saved = state, player
+        state, player = self.session
 
-    clear_screen()
-    print("--- The Simple Choice ---")
-    print(format_text(node["text"]))
-    print("-" * 25)
+    def __exit__(self, *exc_info):
+        global state, player
+        state, player = self.saved
 
-    # Handle direct input nodes
+def available_choices(node, current_state):
+    """Returns the choices of a node whose required_state (if any) is met."""
+    return [
+        choice for choice in node.get("choices", ())
+        if "required_state" not in choice or choice["required_state"](current_state)
+    ]
+
+def render_node(node, choices, mode="plain"):
+    """Returns the lines shown for a node and its available choices, formatted for mode."""
+    lines = ["--- The Simple Choice ---", format_text(node["text"], mode), "-" * 25]
+    if node.get("input_prompt"):
+        return lines # Input nodes show a prompt instead of choices
+
+    labels = format_texts([choice["text"] for choice in choices], mode)
+    for i, label in enumerate(labels):
+        lines.append(f"{i + 1}. {label}")
+    if not choices:
+        lines.append("\nThere are no choices here.")
+        lines.append("Q. Quit")
+    return lines
+
+def resolve_input(node, choices, user_input):
+    """
+    Works out where an input leads without changing any state.
+    Returns (next_node_id, chosen_option, error_message); error_message is None if the input is valid.
+    """
+    if node.get("input_prompt"):
+        return node.get("next_text"), None, None # Any text is accepted
+
+    selection = user_input.strip().lower()
+    if selection == 'q' and not choices:
+        return "quit", None, None
+
+    if not selection.isdigit():
+        return None, None, "Please enter the number of your choice."
+    choice_index = int(selection) - 1
+    if not 0 <= choice_index < len(choices):
+        return None, None, "Invalid choice number."
+    chosen_option = choices[choice_index]
+    return chosen_option.get("next_text"), chosen_option, None
+
+def apply_input(node, chosen_option, user_input, story=None):
+    """Applies the effects of a resolved input: after_enter for input nodes, set_state for choices."""
+    story = story or registry
     if node.get("input_prompt"):
-        user_input = input(node.get("input_prompt", "> "))
         if node.get("after_enter"):
+            state_before, player_before = dict(state), dict(player)
             node["after_enter"](user_input)
-        return node.get("next_text"), None # Return next node ID, no choice made
+            story.invalidate(_changed_keys(state_before, state), _changed_keys(player_before, player))
+    elif chosen_option is not None and "set_state" in chosen_option:
+        state.update(chosen_option["set_state"])
+        story.invalidate(state_keys=chosen_option["set_state"].keys())
+        if metrics is not None:
+            metrics.count_set_state(chosen_option["set_state"].keys())
+
+def frame_lines(node_id, story=None):
+    """Returns the lines shown for node_id with the bound state and player, without printing them."""
+    return render_node(*(story or registry).choices(node_id, state))
+
+def step(node_id, user_input, story=None):
+    """
+    Handles one line of input at node_id for the bound state and player, without any I/O.
+    Returns (next_node_id, chosen_option, error_message); effects are only applied for valid input.
+    """
+    story = story or registry
+    node, choices = story.choices(node_id, state)
+    next_node_id, chosen_option, error = resolve_input(node, choices, user_input)
+    if error is None:
+        apply_input(node, chosen_option, user_input, story)
+    return next_node_id, chosen_option, error
 
-    # Handle choice-based nodes
-    available_choices = []
-    if "choices" in node:
-        for i, choice in enumerate(node["choices"]):
-            # Check if choice is conditional and condition met
-            if "required_state" in choice:
-                if not choice["required_state"](state):
-                    continue # Skip this choice if condition not met
-            available_choices.append(choice)
-            print(f"{i + 1}. {format_text(choice['text'])}")
+# --- Input Sources ---
 
-    if not available_choices:
-         print("\nThere are no choices here.")
-         print("Q. Quit")
+# An input source is any object whose read(prompt) returns one line of player input,
+# or raises EOFError when input runs out.
 
+class TerminalInput:
+    """Interactive input through input(), one blocking call per prompt."""
+
+    def read(self, prompt):
+        return input(prompt)
+
+class IteratorInput:
+    """Input taken from an in-memory iterable of lines."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+
+    def read(self, prompt):
+        try:
+            return next(self._lines)
+        except StopIteration:
+            raise EOFError from None
+
+class ScriptInput(IteratorInput):
+    """Input lines from a script file, read in one go."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as script:
+            super().__init__(script.read().splitlines())
+
+class PipedInput(IteratorInput):
+    """Input piped into stdin (or another stream), read in bulk instead of line by line."""
+
+    def __init__(self, stream=None):
+        super().__init__((stream or sys.stdin).read().splitlines())
+
+def open_input(script=None):
+    """
+    Picks the input source: a script file, all of stdin read at once for "-", or otherwise
+    line-by-line input(). stdin is never read in bulk unasked: consoles that aren't TTYs
+    (mintty, IDE consoles, launchers) would wait for EOF before the first frame.
+    """
+    if script == "-":
+        return PipedInput()
+    if script:
+        return ScriptInput(script)
+    return TerminalInput()
+
+terminal_input = TerminalInput()
+
+hint_index = None # A graph_index.GraphIndex when the in-game hint command is enabled
+history = None # A history.History when the back command is enabled
+
+def go_back(journal=None):
+    """Restores the state and player of the previous step in history and returns its node ID."""
+    step = history.back()
+    state_before, player_before = dict(state), dict(player)
+    state.clear()
+    state.update(step.state)
+    player.clear()
+    player.update(step.player)
+    registry.invalidate(_changed_keys(state_before, state), _changed_keys(player_before, player))
+    if journal is not None:
+        journal.checkpoint(step.node_id, state, player) # The journal only holds forward deltas
+    return step.node_id
+
+def show_text_node(node_id, journal=None, source=None):
+    """
+    Displays the text and choices for a given node, reading input from source (default: the terminal)
+    and recording the transition in journal if given.
+    """
+    read = (source or terminal_input).read
+    if metrics is not None:
+        return metrics.time_node(node_id, lambda timed_read: _show_text_node(node_id, journal, timed_read), read)
+    return _show_text_node(node_id, journal, read)
+
+def _show_text_node(node_id, journal, read):
+    if node_id not in registry:
+        print(f"Error: Node '{node_id}' not found!")
+        return None, None # Indicate error
+
+    node, choices = registry.choices(node_id, state) # Cached unless a field the node reads has changed
+
+    if metrics is None:
+        lines = render_node(node, choices, renderer.text_mode())
+    else:
+        started = time.perf_counter()
+        lines = render_node(node, choices, renderer.text_mode())
+        metrics.observe("render", time.perf_counter() - started)
+    if hint_index is not None and not node.get("input_prompt"):
+        lines.append("H. Hint")
+    can_go_back = (
+        history is not None and history.can_go_back()
+        and not node.get("input_prompt") and not node.get("hide_back_button")
+    )
+    if can_go_back:
+        lines.append("B. Back")
+    if metrics is None:
+        renderer.present(lines) # One buffered write per frame
+    else:
+        started = time.perf_counter()
+        renderer.present(lines)
+        metrics.observe("present", time.perf_counter() - started)
+
+    # Handle direct input nodes
+    if node.get("input_prompt"):
+        user_input = read(node.get("input_prompt", "> "))
+        apply_input(node, None, user_input)
+        if journal is not None:
+            journal.record(node_id, node.get("next_text"), text=user_input, state=state, player=player)
+        if history is not None:
+            history.record(node.get("next_text"), state, player)
+        return node.get("next_text"), None # Return next node ID, no choice made
 
     # Get player choice
     while True:
-        selection = input("> ").strip().lower()
-        if selection == 'q' and not available_choices:
-             return "quit", None
-
-        if selection.isdigit():
-            choice_index = int(selection) - 1
-            if 0 <= choice_index < len(available_choices):
-                chosen_option = available_choices[choice_index]
+        selection = read("> ")
+        if hint_index is not None and selection.strip().lower() == "h":
+            renderer.message(hint_index.hint_text(node_id, state))
+            continue
+        if can_go_back and selection.strip().lower() == "b":
+            return go_back(journal), None
+        next_node_id, chosen_option, error = resolve_input(node, choices, selection)
+        if error:
+            renderer.message(error)
+            continue
 
-                # Update state if specified by the choice
-                if "set_state" in chosen_option:
-                    state.update(chosen_option["set_state"])
-                    print(f"(State updated: {chosen_option['set_state']})") # Debugging
+        # Update state if specified by the choice
+        apply_input(node, chosen_option, selection)
+        if metrics is not None and chosen_option is not None:
+            metrics.count_choice(node_id, chosen_option)
+        if chosen_option is not None and "set_state" in chosen_option:
+            renderer.message(f"(State updated: {chosen_option['set_state']})") # Debugging
+        if journal is not None:
+            journal.record(
+                node_id, next_node_id,
+                choice=choices.index(chosen_option) if chosen_option is not None else None,
+                delta=chosen_option.get("set_state") if chosen_option is not None else None,
+                state=state, player=player,
+            )
+        if history is not None and next_node_id not in TERMINALS:
+            history.record(next_node_id, state, player)
 
-                return chosen_option.get("next_text"), chosen_option # Return next node ID and the choice made
-            else:
-                print("Invalid choice number.")
-        else:
-            print("Please enter the number of your choice.")
+        return next_node_id, chosen_option # Return next node ID and the choice made
 
 
 # --- Main Game Loop ---
 
-def main():
-    """Runs the main game loop."""
-    play_again = True
-    while play_again:
-        init_game()
-        current_node_id = "intro" # Start node
+def main(journal=None, source=None):
+    """
+    Runs the main game loop, reading input from source (default: the terminal)
+    and resuming from and saving to journal if given.
+    """
+    global state, player
+    resumed = journal.resume() if journal is not None else None
+    try:
+        play_again = True
+        while play_again:
+            init_game()
+            current_node_id = "intro" # Start node
+            if resumed is not None:
+                current_node_id, state, player = resumed # Pick up the saved game
+                resumed = None
+            if history is not None:
+                history.start(current_node_id, state, player)
+
+            while current_node_id not in ["quit", "restart"]:
+                try:
+                    next_node_id, choice_made = show_text_node(current_node_id, journal, source)
+                except EOFError:
+                    next_node_id = "quit" # Input ran out (end of a script or Ctrl+D)
+
+                if next_node_id is None: # Handle node not found error
+                     print("A problem occurred. Exiting game.")
+                     current_node_id = "quit"
+                     break
+
+                if next_node_id == "restart":
+                    break # Exit inner loop to restart
+
+                if next_node_id == "quit":
+                    current_node_id = "quit" # Ensure outer loop exits if player chooses quit
+                    break # Exit inner loop
 
-        while current_node_id not in ["quit", "restart"]:
-            next_node_id, choice_made = show_text_node(current_node_id)
 
-            if next_node_id is None: # Handle node not found error
-                 print("A problem occurred. Exiting game.")
-                 current_node_id = "quit"
-                 break
+                current_node_id = next_node_id
 
-            if next_node_id == "restart":
-                break # Exit inner loop to restart
+            # End of a game round
+            if current_node_id == "quit":
+                play_again = False
+                print("\nThanks for playing!")
+            else: # Assumed restart
+                 print("\nRestarting game...")
+                 # No need to ask, secretEnding choice leads directly to restart or quit
+    finally:
+        if journal is not None:
+            journal.close() # Flush and fsync whatever is still buffered
 
-            if next_node_id == "quit":
-                current_node_id = "quit" # Ensure outer loop exits if player chooses quit
-                break # Exit inner loop
+def profile_startup(started):
+    """
+    Reports start-up times on stderr once the first frame has been drawn: the module import,
+    then the time from started to the first frame. The process CPU time also covers
+    starting the interpreter and compiling the script.
+    """
+    present = renderer.present
+    def present_and_report(lines):
+        present(lines)
+        renderer.present = present # Only the first frame
+        print(
+            f"Startup: import {(started - _import_started) * 1000:.1f} ms, "
+            f"first frame {(time.perf_counter() - started) * 1000:.1f} ms later, "
+            f"{time.process_time() * 1000:.1f} ms CPU since the process started",
+            file=sys.stderr,
+        )
+    renderer.present = present_and_report
+
+# (flag, argparse keyword arguments); argparse is only imported for --help and mistakes
+_OPTIONS = (
+    ("--journal", {"metavar": "PATH", "help": "save progress to PATH and resume from it"}),
+    ("--story", {"metavar": "PATH", "help": "play a story file or compiled snapshot instead of the built-in story"}),
+    ("--script", {"metavar": "PATH", "help": "read inputs from a script file, one per line ('-' for stdin)"}),
+    ("--hints", {"action": "store_true", "help": "enable the H command, which suggests the way to the secret ending"}),
+    ("--back", {"action": "store_true", "help": "enable the B command, which undoes the last choice (any number of times)"}),
+    ("--metrics", {"metavar": "PATH", "help": "time the game loop and write metrics to PATH on exit (JSON if it ends in .json, else Prometheus text)"}),
+    ("--startup-profile", {"action": "store_true", "help": "report import and first-frame times on stderr"}),
+)
 
+def _parse_known(argv):
+    """
+    Parses argv without argparse (which pulls in re and gettext) when it only holds
+    the options above, spelled out in full; returns None for anything else.
+    """
+    import types
+    takes_value = {flag: options.get("action") != "store_true" for flag, options in _OPTIONS}
+    parsed = {flag[2:].replace("-", "_"): None if value else False for flag, value in takes_value.items()}
+    arguments = iter(argv)
+    for argument in arguments:
+        flag, equals, value = argument.partition("=")
+        if flag not in takes_value or (equals and not takes_value[flag]):
+            return None
+        if not takes_value[flag]:
+            value = True
+        elif not equals:
+            value = next(arguments, None)
+            if value is None or value.startswith("--"):
+                return None
+        parsed[flag[2:].replace("-", "_")] = value
+    return types.SimpleNamespace(**parsed)
 
-            current_node_id = next_node_id
+def parse_args(argv=None):
+    """Parses the command line options."""
+    if argv is None:
+        argv = sys.argv[1:]
+    parsed = _parse_known(argv)
+    if parsed is not None:
+        return parsed
 
-        # End of a game round
-        if current_node_id == "quit":
-            play_again = False
-            print("\nThanks for playing!")
-        else: # Assumed restart
-             print("\nRestarting game...")
-             # No need to ask, secretEnding choice leads directly to restart or quit
+    import argparse
+    parser = argparse.ArgumentParser(description="The Simple Choice")
+    for flag, options in _OPTIONS:
+        parser.add_argument(flag, **options)
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    started = time.perf_counter()
+    args = parse_args()
+    if args.startup_profile:
+        profile_startup(started)
+    if args.story:
+        import story_format
+        try:
+            use_story(story_format.load(args.story, prewarm=True, validate=True))
+        except ValueError as error:
+            sys.exit(str(error)) # A story that can't be played, or a snapshot from another Python
+    if args.hints:
+        import graph_index
+        hint_index = graph_index.GraphIndex(registry)
+    if args.back:
+        import history as history_module
+        history = history_module.History()
+    if args.metrics:
+        from metrics import Metrics
+        metrics = Metrics().write_on_exit(args.metrics)
+    source = open_input(args.script)
+    if args.journal:
+        import journal
+        main(journal.Journal(args.journal), source)
+    else:
+        main(source=source)
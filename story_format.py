@@ -0,0 +1,218 @@
+"""
+Data-driven story files and compiled binary snapshots.
+
+A story file is JSON of the form {"nodes": {node_id: node, ...}} where each node may have:
+    "text"             template text, e.g. "Hello, **{player.name}**!" (see simple_game.Template)
+    "choices"          [{"text", "next_text", "required_state", "set_state"}, ...]
+                       required_state uses the declarative form of simple_game.compile_condition
+    "input_prompt"     prompt for a text input node, with "next_text" as its successor
+    "after_enter"      {"set_player": field} or {"set_state": key}, plus optional "default";
+                       stores the stripped input (or the default if it is empty)
+    "hide_back_button"
+
+`python story_format.py compile story.json story.snap` writes a snapshot that
+load_snapshot memory-maps; nodes are then decoded one at a time on first use,
+so even very large stories open in milliseconds. With prewarm the OS is asked
+to read the whole file ahead, so later first visits don't wait on the disk.
+Snapshots hold marshal data and are tied to the marshal version that wrote them;
+opening one needs neither json nor hashlib, which keep `--story x.snap` starts short.
+"""
+import marshal
+import mmap
+import struct
+import sys
+import zlib
+from collections.abc import Mapping
+
+import simple_game
+
+SNAPSHOT_MAGIC = b"SCSNAP2\x00"
+_HEADER = struct.Struct("<8sII") # magic, marshal version, node count
+_INDEX_ENTRY = struct.Struct("<IQI") # id hash, blob offset, blob length; sorted by hash
+
+# --- Node Construction ---
+
+def _after_enter(spec):
+    """Builds an after_enter callback from its declarative form."""
+    default = spec.get("default", "")
+    if "set_player" in spec:
+        field = spec["set_player"]
+        return lambda user_input: simple_game.player.update({field: user_input.strip() or default})
+    key = spec["set_state"]
+    return lambda user_input: simple_game.state.update({key: user_input.strip() or default})
+
+def node_factory(node_id, data):
+    """Returns a node function for one node's data, reading the module-level state and player like get_text_nodes."""
+    template = None
+
+    def build():
+        nonlocal template
+        if template is None:
+            template = simple_game.Template(data.get("text", "")) # Parsed on first visit only
+        node = {"id": node_id, "text": template.render()}
+        for key in ("input_prompt", "next_text", "hide_back_button"):
+            if key in data:
+                node[key] = data[key]
+        if "after_enter" in data:
+            node["after_enter"] = _after_enter(data["after_enter"])
+        if "choices" in data or "input_prompt" not in data:
+            node["choices"] = [dict(choice) for choice in data.get("choices", ())]
+        return node
+
+    return build
+
+def validate_story(nodes):
+    """
+    Raises ValueError listing every problem that would stop node data ({node_id: node}) from playing:
+    templates that don't parse, required_state or after_enter specs that don't compile,
+    and next_text targets that are neither nodes nor quit/restart.
+    Templates are otherwise only parsed when a player first reaches their node.
+    """
+    problems = []
+    for node_id, data in nodes.items():
+        try:
+            simple_game.Template(data.get("text", ""))
+        except (TypeError, ValueError) as error:
+            problems.append(f"{node_id}: {error}")
+        spec = data.get("after_enter")
+        if spec is not None and not ("set_player" in spec or "set_state" in spec):
+            problems.append(f"{node_id}: after_enter needs set_player or set_state")
+
+        targets = []
+        if "input_prompt" in data:
+            targets.append(data.get("next_text"))
+        for position, choice in enumerate(data.get("choices", ()), 1):
+            if "required_state" in choice:
+                try:
+                    simple_game.compile_condition(choice["required_state"])
+                except (KeyError, TypeError, ValueError) as error:
+                    problems.append(f"{node_id}: choice {position} has a bad required_state ({error!r})")
+            targets.append(choice.get("next_text"))
+        for target in targets:
+            if target not in nodes and target not in simple_game.TERMINALS:
+                problems.append(f"{node_id}: next_text {target!r} is not a node")
+    if problems:
+        raise ValueError("The story can't be played:\n  " + "\n  ".join(problems))
+
+def load_story(path, validate=False):
+    """Loads a JSON story file and returns its node functions; with validate, checks it first (see validate_story)."""
+    import json
+    with open(path, encoding="utf-8") as source:
+        nodes = json.load(source)["nodes"]
+    if validate:
+        validate_story(nodes)
+    return {node_id: node_factory(node_id, data) for node_id, data in nodes.items()}
+
+# --- Snapshots ---
+
+def _id_hash(node_id):
+    return zlib.crc32(node_id.encode("utf-8"))
+
+def compile_snapshot(nodes, path):
+    """Writes node data ({node_id: node}) as a snapshot file, after checking it with validate_story."""
+    validate_story(nodes)
+    blobs = []
+    for node_id, data in nodes.items():
+        blobs.append((_id_hash(node_id), marshal.dumps([node_id, data], marshal.version)))
+    blobs.sort(key=lambda entry: entry[0])
+
+    offset = _HEADER.size + _INDEX_ENTRY.size * len(blobs)
+    index = bytearray()
+    for id_hash, blob in blobs:
+        index += _INDEX_ENTRY.pack(id_hash, offset, len(blob))
+        offset += len(blob)
+    with open(path, "wb") as out:
+        out.write(_HEADER.pack(SNAPSHOT_MAGIC, marshal.version, len(blobs)))
+        out.write(index)
+        for _, blob in blobs:
+            out.write(blob)
+
+class SnapshotStory(Mapping):
+    """
+    Node functions backed by a memory-mapped snapshot.
+    Lookups binary-search the hash index; a node is decoded the first time it is asked for.
+    """
+
+    def __init__(self, path, prewarm=False):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a story snapshot")
+        if version != marshal.version:
+            self.close()
+            raise ValueError(f"{path} was compiled with marshal version {version}, this Python reads {marshal.version}; compile it again")
+        if prewarm and hasattr(mmap, "MADV_WILLNEED"): # Not on Windows
+            self._map.madvise(mmap.MADV_WILLNEED) # Returns at once; the kernel reads ahead in the background
+        self._factories = {} # Decoded so far
+
+    def _read(self, position):
+        _, offset, length = _INDEX_ENTRY.unpack_from(self._map, _HEADER.size + position * _INDEX_ENTRY.size)
+        return marshal.loads(self._map[offset:offset + length])
+
+    def _find(self, node_id):
+        """Returns the data stored for node_id in the snapshot, or None."""
+        id_hash = _id_hash(node_id)
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if _INDEX_ENTRY.unpack_from(self._map, _HEADER.size + middle * _INDEX_ENTRY.size)[0] < id_hash:
+                low = middle + 1
+            else:
+                high = middle
+        # Entries with the same hash sit next to each other
+        while low < self._count and _INDEX_ENTRY.unpack_from(self._map, _HEADER.size + low * _INDEX_ENTRY.size)[0] == id_hash:
+            found_id, data = self._read(low)
+            if found_id == node_id:
+                return data
+            low += 1
+        return None
+
+    def __getitem__(self, node_id):
+        factory = self._factories.get(node_id)
+        if factory is None:
+            data = self._find(node_id)
+            if data is None:
+                raise KeyError(node_id)
+            factory = self._factories[node_id] = node_factory(node_id, data)
+        return factory
+
+    def __contains__(self, node_id):
+        return node_id in self._factories or self._find(node_id) is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self._read(position)[0]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+def load_snapshot(path, prewarm=False):
+    """Opens a snapshot; nodes are decoded lazily as the game reaches them."""
+    return SnapshotStory(path, prewarm)
+
+def load(path, prewarm=False, validate=False):
+    """
+    Loads a story file or snapshot, whichever path holds.
+    validate checks story files; snapshots were checked when they were compiled.
+    """
+    with open(path, "rb") as source:
+        is_snapshot = source.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    return load_snapshot(path, prewarm) if is_snapshot else load_story(path, validate)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "compile":
+        sys.exit("usage: python story_format.py compile STORY.json SNAPSHOT")
+    import json
+    with open(sys.argv[2], encoding="utf-8") as story_source:
+        story_nodes = json.load(story_source)["nodes"]
+    try:
+        compile_snapshot(story_nodes, sys.argv[3])
+    except ValueError as error:
+        sys.exit(str(error))
+    print(f"Compiled {len(story_nodes)} nodes into {sys.argv[3]}")
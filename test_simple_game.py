@@ -1,15 +1,38 @@
 import unittest
 from unittest.mock import patch, call
 import io
+import json
+import marshal
+import struct
 import sys
 import os
 
 # Import the game script
 import simple_game
+import headless
+import explore
+import server
+import compact_state
+import journal
+import benchmarks
+import story_format
+import graph_index
+import montecarlo
+import metrics
+import history
+import tempfile
+import asyncio
+import subprocess
+import time
 
 # Use TestLoader for modern unittest compatibility
 loader = unittest.TestLoader()
 
+class FakeTerminal(io.StringIO):
+    """A StringIO that claims to be a TTY."""
+    def isatty(self):
+        return True
+
 # --- Unit Test Class (Unchanged from previous version) ---
 class TestSimpleGameUnit(unittest.TestCase):
     """Unit tests focusing on isolated functions."""
@@ -20,6 +43,22 @@ class TestSimpleGameUnit(unittest.TestCase):
         self.assertEqual(simple_game.format_text("This is *important*."), "This is important.")
     def test_format_text_mixed(self):
         self.assertEqual(simple_game.format_text("**Bold** and *italic*."), "Bold and italic.")
+    def test_format_text_ansi(self):
+        self.assertEqual(simple_game.format_text("**Bold** and *italic*.", "ansi"),
+                         "\x1b[1mBold\x1b[22m and \x1b[3mitalic\x1b[23m.")
+    def test_format_text_ansi_closes_unbalanced_markers(self):
+        self.assertEqual(simple_game.format_text("a **b", "ansi"), "a \x1b[1mb\x1b[22m")
+    def test_format_texts_batch_and_cache(self):
+        self.assertEqual(simple_game.format_texts(["*a*", "**b**", "c"]), ["a", "b", "c"])
+        with patch('simple_game._render_markup', wraps=simple_game._render_markup) as render:
+            simple_game.format_text("*a*")
+            simple_game.format_text("*new*")
+        self.assertEqual(render.call_args_list, [call("*new*", "plain")]) # "*a*" came from the cache
+    def test_format_text_cache_is_bounded(self):
+        with patch('simple_game._MARKUP_CACHE_SIZE', 2), patch.dict(simple_game._markup_cache, clear=True):
+            for text in ("a", "b", "a", "c"):
+                simple_game.format_text(text)
+            self.assertEqual(list(simple_game._markup_cache), [("a", "plain"), ("c", "plain")]) # "b" was used least recently
     @patch('sys.stdout', new_callable=io.StringIO)
     def test_init_game_resets_state(self, mock_stdout):
         simple_game.state = {"hasKey": True, "score": 10}
@@ -30,11 +69,10 @@ class TestSimpleGameUnit(unittest.TestCase):
         self.assertIn("Simple Choice Game Initialized!", mock_stdout.getvalue())
     @patch('os.system')
     def test_clear_screen(self, mock_os_system):
-        simple_game.clear_screen()
-        if os.name == 'nt':
-            mock_os_system.assert_called_once_with('cls')
-        else:
-            mock_os_system.assert_called_once_with('clear')
+        with patch('sys.stdout', new_callable=FakeTerminal), patch('simple_game.supports_ansi', return_value=True):
+            simple_game.clear_screen()
+            self.assertEqual(sys.stdout.getvalue(), simple_game.CLEAR_SEQUENCE)
+        mock_os_system.assert_not_called() # No shell process per frame
     def test_get_node_blue_room_no_key(self):
         simple_game.state = {}
         nodes = simple_game.get_text_nodes()
@@ -218,12 +256,880 @@ class TestSimpleGameIntegration(unittest.TestCase):
         self.assertIn("Thanks for playing!", output) # Check the final quit message
         self.assertTrue(simple_game.state.get("hasKey")) # Should have key at the end
 
+class TestStoryRegistry(unittest.TestCase):
+    """Tests for the compiled node registry and its dependency cache."""
+
+    def setUp(self):
+        simple_game.state = {}
+        simple_game.player = {"name": "Wanderer"}
+        self.registry = simple_game.StoryRegistry(simple_game.get_text_nodes())
+
+    def test_node_is_reused_while_inputs_are_unchanged(self):
+        first = self.registry.get("greeting")
+        self.assertIs(self.registry.get("greeting"), first)
+
+    def test_node_is_rebuilt_when_a_read_field_changes(self):
+        greeting = self.registry.get("greeting")
+        blue_room = self.registry.get("blueRoom")
+        simple_game.state["hasKey"] = True
+        self.assertIs(self.registry.get("greeting"), greeting) # greeting never reads hasKey
+        self.assertIn("already took the small key", self.registry.get("blueRoom")["text"])
+        self.assertIsNot(self.registry.get("blueRoom"), blue_room)
+        simple_game.player["name"] = "Renamed"
+        self.assertIn("Hello, **Renamed**!", self.registry.get("greeting")["text"])
+
+    def test_earlier_variants_are_reused(self):
+        without_key = self.registry.get("blueRoom")
+        simple_game.state["hasKey"] = True
+        with_key = self.registry.get("blueRoom")
+        del simple_game.state["hasKey"]
+        self.assertIs(self.registry.get("blueRoom"), without_key)
+        simple_game.state["hasKey"] = True
+        self.assertIs(self.registry.get("blueRoom"), with_key)
+
+    def test_equal_values_of_other_types_rebuild_the_node(self):
+        registry = simple_game.StoryRegistry({"score": lambda: {"text": f"Score: {simple_game.state['score']}", "choices": []}})
+        texts = []
+        for value in (1.0, 1, True):
+            simple_game.state["score"] = value
+            registry.invalidate(state_keys={"score"})
+            texts.append(registry.get("score")["text"])
+        self.assertEqual(texts, ["Score: 1.0", "Score: 1", "Score: True"])
+
+    def test_invalidate_trims_only_dependent_nodes(self):
+        for name in ("A", "B", "C"):
+            simple_game.player["name"] = name
+            self.registry.get("greeting")
+        self.registry.get("blueRoom")
+        simple_game.player["name"] = "D"
+        self.registry.invalidate(player_keys=["name"])
+        self.assertEqual(len(self.registry._cache["greeting"]), 1) # Only the newest one built for other values
+        self.assertIn("Hello, **C**!", self.registry._cache["greeting"][0].node["text"])
+        self.assertEqual(len(self.registry._cache["blueRoom"]), 1)
+
+    def test_state_reassignment_is_detected(self):
+        self.registry.get("blueRoom")
+        simple_game.state = {"hasKey": True}
+        self.assertIn("already took the small key", self.registry.get("blueRoom")["text"])
+
+
+class TestHeadless(unittest.TestCase):
+    """Tests for scripted playthroughs without terminal I/O."""
+
+    WINNING_SCRIPT = ['1', 'Bot', '2', '1', '1', '2', '2']
+
+    @patch('builtins.input', side_effect=AssertionError("input() must not be called"))
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_play_script_to_secret_ending(self, mock_stdout, mock_input):
+        result = headless.play(self.WINNING_SCRIPT)
+        self.assertEqual(result.path, ["intro", "askName", "greeting", "blueRoom", "greeting", "redRoom", "secretEnding"])
+        self.assertEqual(result.ending, "secretEnding")
+        self.assertEqual(result.outcome, "quit")
+        self.assertEqual(result.state, {"hasKey": True})
+        self.assertEqual(result.player["name"], "Bot")
+        self.assertEqual(mock_stdout.getvalue(), "")
+
+    def test_play_does_not_touch_global_session(self):
+        simple_game.state = {"score": 1}
+        headless.play(self.WINNING_SCRIPT)
+        self.assertEqual(simple_game.state, {"score": 1})
+
+    def test_play_skips_invalid_input_and_stops_when_script_runs_out(self):
+        result = headless.play(['x', '9', '1'])
+        self.assertEqual(result.path, ["intro", "askName"])
+        self.assertEqual(result.outcome, "exhausted")
+
+    def test_invalid_input_counts_towards_max_steps(self):
+        result = headless.play(lambda node, choices, current_state: "x" if choices else "", max_steps=10)
+        self.assertEqual(result.outcome, "max_steps")
+        self.assertEqual(result.path, ["intro"])
+
+    def test_play_with_policy(self):
+        result = headless.play(headless.random_policy, max_steps=50)
+        self.assertEqual(result.path[0], "intro")
+        self.assertIn(result.outcome, ("quit", "restart", "max_steps"))
+
+    def test_run_batch_keeps_order_across_processes(self):
+        scripts = [self.WINNING_SCRIPT, ['1', 'Other', '1', '1', '2']] * 4
+        results = headless.run_batch(scripts, processes=2, chunksize=3)
+        self.assertEqual([r.player["name"] for r in results], ["Bot", "Other"] * 4)
+        self.assertEqual(results[1].outcome, "exhausted")
+
+
+class TestExplorer(unittest.TestCase):
+    """Tests for the (node, state) reachability explorer."""
+
+    def test_built_in_story(self):
+        report = explore.explore()
+        self.assertEqual(report.unreachable_nodes, ["deadEnd"])
+        self.assertEqual(report.dangling_targets, [])
+        self.assertEqual(report.stuck_states, [])
+        self.assertFalse(report.truncated)
+        self.assertIn(("secretEnding", (("hasKey", True),)), report.reachable)
+        self.assertNotIn(("secretEnding", ()), report.reachable) # Needs the key
+
+    def test_dangling_targets_and_stuck_states(self):
+        factories = {
+            "intro": lambda: {"id": "intro", "text": "", "choices": [
+                {"text": "Loop", "next_text": "loop"},
+                {"text": "Broken", "next_text": "nowhere"},
+                {"text": "Leave", "next_text": "quit", "required_state": lambda s: s.get("canLeave", False)},
+            ]},
+            "loop": lambda: {"id": "loop", "text": "", "choices": [{"text": "Again", "next_text": "loop"}]},
+        }
+        report = explore.explore(simple_game.StoryRegistry(factories))
+        self.assertEqual(report.dangling_targets, [("intro", "nowhere")])
+        self.assertIn(("loop", ()), report.stuck_states)
+        self.assertIn(("intro", ()), report.stuck_states) # "Leave" is never available
+
+    def test_transitions_are_memoized_on_read_keys(self):
+        explorer = explore.Explorer()
+        first = explorer.transitions("redRoom", {"hasKey": True})
+        self.assertIs(explorer.transitions("redRoom", {"hasKey": True, "unrelated": 1}), first)
+        self.assertEqual(len(explorer.transitions("redRoom", {})), 1)
+
+    def test_print_report(self):
+        out = io.StringIO()
+        explore.print_report(explore.explore(), out)
+        self.assertIn("Unreachable nodes: deadEnd", out.getvalue())
+
+
+@patch('simple_game.supports_ansi', side_effect=lambda stream: stream.isatty())
+class TestRenderer(unittest.TestCase):
+    """Tests for the buffered frame renderer."""
+
+    def setUp(self):
+        self.out = FakeTerminal()
+        self.renderer = simple_game.Renderer(self.out)
+
+    def test_plain_output_for_non_tty(self, mock_ansi):
+        out = io.StringIO()
+        simple_game.Renderer(out).present(["Title", "Body"])
+        self.assertEqual(out.getvalue(), "Title\nBody\n")
+
+    def test_first_frame_clears_screen(self, mock_ansi):
+        self.renderer.present(["Title", "Body"])
+        self.assertEqual(self.out.getvalue(), simple_game.CLEAR_SEQUENCE + "Title\nBody\n")
+
+    def test_next_frame_only_redraws_changed_lines(self, mock_ansi):
+        self.renderer.present(["Title", "Body", "1. Go"])
+        self.out.seek(0)
+        self.out.truncate()
+        self.renderer.present(["Title", "Other body"])
+        written = self.out.getvalue()
+        self.assertNotIn(simple_game.CLEAR_SEQUENCE, written)
+        self.assertNotIn("Title", written)
+        self.assertIn("\x1b[2;1HOther body\x1b[K", written)
+        self.assertTrue(written.endswith("\x1b[3;1H\x1b[J")) # Old third line is wiped
+
+    def test_clear_forces_full_redraw(self, mock_ansi):
+        self.renderer.present(["Title"])
+        self.renderer.clear()
+        self.out.seek(0)
+        self.out.truncate()
+        self.renderer.present(["Title"])
+        self.assertTrue(self.out.getvalue().startswith(simple_game.CLEAR_SEQUENCE))
+
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    """Tests for the asyncio multi-session server over localhost."""
+
+    async def asyncSetUp(self):
+        self.server = server.GameServer(port=0)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def play(self, name):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write("\n".join(['1', name, '2', 'x', '1', '1', '2', '2']).encode() + b"\n")
+        await writer.drain()
+        output = (await reader.read()).decode()
+        writer.close()
+        return output
+
+    async def test_concurrent_sessions_are_isolated(self):
+        simple_game.state = {}
+        outputs = await asyncio.gather(*(self.play(f"Player{i}") for i in range(50)))
+        for i, output in enumerate(outputs):
+            self.assertIn(f"Congratulations, Player{i}!", output)
+            self.assertIn("Please enter the number of your choice.", output)
+            self.assertTrue(output.endswith("Thanks for playing!\n"))
+        stats = self.server.stats()
+        self.assertEqual(stats["connections_total"], 50)
+        self.assertEqual(stats["connections_active"], 0)
+        self.assertEqual(stats["latency"]["count"], 50 * 8)
+        self.assertEqual(simple_game.state, {}) # The module-level session is untouched
+
+    def test_session_restart(self):
+        session = server.Session()
+        session.state["hasKey"] = True
+        session.node_id = "secretEnding"
+        reply, finished = session.handle("1")
+        self.assertFalse(finished)
+        self.assertIn("Restarting game...", reply)
+        self.assertEqual((session.node_id, session.state), ("intro", {}))
+
+
+class TestCompactState(unittest.TestCase):
+    """Tests for the packed session representation."""
+
+    def setUp(self):
+        self.schema = compact_state.SessionSchema.from_story()
+
+    def test_schema_discovers_flags(self):
+        self.assertEqual(self.schema.flags, ("hasKey",))
+        self.assertIn("secretEnding", self.schema.node_ids)
+
+    def test_round_trip_through_bytes(self):
+        packed = compact_state.CompactSession.pack(self.schema, "redRoom", {"hasKey": True}, {"name": "Ada"})
+        self.assertIsNone(packed.extra)
+        data = packed.to_bytes()
+        self.assertLessEqual(len(data), 8)
+        restored = compact_state.CompactSession.from_bytes(data)
+        self.assertEqual(restored, packed)
+        self.assertEqual(restored.unpack(self.schema), ("redRoom", {"hasKey": True}, {"name": "Ada"}))
+
+    def test_leftover_fields_round_trip(self):
+        session_state = {"hasKey": False, "score": 3}
+        session_player = {"name": "Ada", "title": "Dr"}
+        packed = compact_state.CompactSession.pack(self.schema, "intro", session_state, session_player)
+        restored = compact_state.CompactSession.from_bytes(packed.to_bytes())
+        self.assertEqual(restored.unpack(self.schema), ("intro", session_state, session_player))
+
+    def test_sessions_are_small_and_share_names(self):
+        a = compact_state.CompactSession.pack(self.schema, "intro", {}, {"name": "".join(["Wan", "derer"])})
+        b = compact_state.CompactSession.pack(self.schema, "intro", {}, {"name": "Wanderer"})
+        self.assertIs(a.name, b.name)
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertLess(sys.getsizeof(a), 100)
+
+    def test_bulk_write_and_read(self):
+        sessions = [
+            compact_state.CompactSession.pack(self.schema, "greeting", {"hasKey": i % 2 == 0}, {"name": f"P{i}"})
+            for i in range(100)
+        ]
+        stream = io.BytesIO()
+        compact_state.write_sessions(sessions, stream)
+        stream.seek(0)
+        self.assertEqual(list(compact_state.read_sessions(stream)), sessions)
+
+
+class TestJournal(unittest.TestCase):
+    """Tests for the append-only save journal."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "save.journal")
+
+    def record_key_run(self, log):
+        log.record("intro", "askName", choice=0)
+        log.record("askName", "greeting", text="Ada")
+        log.record("greeting", "blueRoom", choice=1)
+        log.record("blueRoom", "greeting", choice=0, delta={"hasKey": True},
+                   state={"hasKey": True}, player={"name": "Ada"})
+
+    def test_resume_replays_journal(self):
+        log = journal.Journal(self.path)
+        self.assertIsNone(log.resume())
+        self.record_key_run(log)
+        log.close()
+        self.assertEqual(journal.resume(self.path), ("greeting", {"hasKey": True}, {"name": "Ada"}))
+
+    def test_resume_only_replays_tail_after_checkpoint(self):
+        log = journal.Journal(self.path, checkpoint_every=4)
+        self.record_key_run(log) # Fourth record triggers a checkpoint
+        log.record("greeting", "redRoom", choice=0)
+        log.close()
+        with open(self.path, "r+b") as raw: # Wreck everything the checkpoint covers
+            offset = json.load(open(self.path + ".checkpoint"))["offset"]
+            raw.write(b"#" * offset)
+        self.assertEqual(journal.resume(self.path), ("redRoom", {"hasKey": True}, {"name": "Ada"}))
+
+    def test_truncated_record_and_quit(self):
+        log = journal.Journal(self.path)
+        self.record_key_run(log)
+        log.close()
+        with open(self.path, "ab") as raw:
+            raw.write(b'{"node": "greeting", "ne') # Crash mid-write
+        self.assertEqual(journal.resume(self.path)[0], "greeting")
+        log = journal.Journal(self.path)
+        log.record("greeting", "quit")
+        log.close()
+        self.assertIsNone(journal.resume(self.path))
+
+    def test_new_game_after_quit_starts_fresh(self):
+        log = journal.Journal(self.path)
+        self.record_key_run(log)
+        log.record("greeting", "quit")
+        log.record("intro", "askName", choice=0)
+        log.record("askName", "greeting", text="Bea")
+        log.close()
+        self.assertEqual(journal.resume(self.path), ("greeting", {}, {"name": "Bea"}))
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('simple_game.clear_screen')
+    def test_main_saves_and_resumes(self, mock_clear, mock_stdout):
+        with patch('builtins.input', side_effect=['1', 'Ada', '2', '1', KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                simple_game.main(journal.Journal(self.path, batch_size=100))
+        with patch('builtins.input', side_effect=['1', '2', '2']):
+            simple_game.main(journal.Journal(self.path))
+        self.assertIn("Congratulations, Ada!", mock_stdout.getvalue())
+
+
+class TestBenchmarks(unittest.TestCase):
+    """Smoke tests for the benchmark suite."""
+
+    def test_synthetic_story_is_playable(self):
+        story = simple_game.StoryRegistry(benchmarks.synthetic_story(25))
+        result = headless.play(benchmarks.synthetic_script(25), story)
+        self.assertEqual(result.ending, "ending")
+        self.assertEqual(result.outcome, "quit")
+        self.assertEqual(len(result.path), 25 + 3)
+
+    def test_transition_bench_restores_io(self):
+        stdout, renderer = sys.stdout, simple_game.renderer
+        self.assertGreater(benchmarks.bench_transition(simple_game.registry, "greeting", "1", repeat=1, number=10), 0)
+        self.assertIs(sys.stdout, stdout)
+        self.assertIs(simple_game.renderer, renderer)
+
+    def test_session_memory(self):
+        results = benchmarks.bench_session_memory(200)
+        self.assertGreater(results["compact"], 0)
+        self.assertLess(results["compact"], results["dicts"])
+
+    def test_compare_flags_regressions_over_threshold(self):
+        baseline = {"fast": 1.0, "slow": 1.0}
+        self.assertEqual(benchmarks.compare({"fast": 1.2, "slow": 1.5, "new": 9.0}, baseline, 0.25), [("slow", 1.0, 1.5)])
+
+
+class CountingDict(dict):
+    """A dict that counts reads through get()."""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.gets = []
+    def get(self, key, default=None):
+        self.gets.append(key)
+        return super().get(key, default)
+
+
+class TestConditions(unittest.TestCase):
+    """Tests for declarative guards and incremental choice availability."""
+
+    def test_compile_condition_forms(self):
+        compile_condition = simple_game.compile_condition
+        has_key = compile_condition({"key": "hasKey"})
+        self.assertTrue(has_key({"hasKey": True}))
+        self.assertFalse(has_key({}))
+        rich = compile_condition({"and": [
+            {"key": "gold", "op": ">=", "value": 10, "default": 0},
+            {"or": [{"key": "hasKey"}, {"not": {"key": "door", "op": "in", "value": ["locked", "stuck"]}}]},
+        ]})
+        self.assertEqual(rich.keys, {"gold", "hasKey", "door"})
+        self.assertTrue(rich({"gold": 12, "door": "open"}))
+        self.assertFalse(rich({"gold": 12, "door": "locked"}))
+        self.assertTrue(rich({"gold": 12, "door": "locked", "hasKey": True}))
+        self.assertFalse(rich({"door": "open"}))
+        self.assertIs(compile_condition({"key": "hasKey"}), has_key) # Compiled once
+        self.assertTrue(compile_condition({"key": "x", "op": "is", "value": True})({"x": True}))
+        self.assertTrue(compile_condition({"key": "x", "op": "is", "value": 1})({"x": 1})) # Not the True guard
+
+    def make_registry(self, lambda_calls):
+        def lambda_guard(current_state):
+            lambda_calls.append(1)
+            return True
+        return simple_game.StoryRegistry({
+            "hall": lambda: {"id": "hall", "text": "", "choices": [
+                {"text": "Always", "next_text": "hall"},
+                {"text": "Key", "next_text": "hall", "required_state": {"key": "hasKey"}},
+                {"text": "Gold", "next_text": "hall", "required_state": {"key": "gold", "op": ">", "value": 0, "default": 0}},
+                {"text": "Lambda", "next_text": "hall", "required_state": lambda_guard},
+            ]},
+        })
+
+    def test_only_affected_guards_are_rechecked(self):
+        lambda_calls = []
+        story = self.make_registry(lambda_calls)
+        current_state = CountingDict()
+        _, available = story.choices("hall", current_state)
+        self.assertEqual([c["text"] for c in available], ["Always", "Lambda"])
+
+        current_state.gets.clear()
+        self.assertIs(story.choices("hall", current_state)[1], available) # Nothing changed
+        self.assertEqual(current_state.gets, ["gold", "hasKey"]) # Values checked, no guard re-run
+        self.assertEqual(len(lambda_calls), 2) # Lambda guards are always re-run
+
+        current_state.gets.clear()
+        current_state["hasKey"] = True # No invalidate() needed
+        _, available = story.choices("hall", current_state)
+        self.assertEqual(current_state.gets, ["gold", "hasKey", "hasKey"]) # The gold guard was not re-evaluated
+        self.assertEqual([c["text"] for c in available], ["Always", "Key", "Lambda"])
+        current_state["hasKey"] = 1 # Equal to True but of another type, so the guard is re-checked
+        self.assertEqual(len(story.choices("hall", current_state)[1]), 3)
+
+    def test_in_place_state_change_updates_choices(self):
+        simple_game.state = {}
+        self.assertEqual(len(simple_game.registry.choices("redRoom", simple_game.state)[1]), 1)
+        simple_game.state["hasKey"] = True
+        self.assertEqual(len(simple_game.registry.choices("redRoom", simple_game.state)[1]), 2)
+
+    def test_new_state_object_rechecks_everything(self):
+        story = self.make_registry([])
+        story.choices("hall", {})
+        _, available = story.choices("hall", {"gold": 3})
+        self.assertEqual([c["text"] for c in available], ["Always", "Gold", "Lambda"])
+
+    @patch('builtins.input', side_effect=['2'])
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_red_room_guard_updates_after_set_state(self, mock_stdout, mock_input):
+        simple_game.state = {}
+        self.assertEqual(len(simple_game.registry.choices("redRoom", simple_game.state)[1]), 1)
+        simple_game.apply_input({}, {"set_state": {"hasKey": True}}, "1")
+        next_node_id, _ = simple_game.show_text_node("redRoom")
+        self.assertEqual(next_node_id, "secretEnding")
+
+
+class TestTemplates(unittest.TestCase):
+    """Tests for precompiled node text templates."""
+
+    def test_fields_and_branches(self):
+        template = simple_game.Template("Hi {player.name}{if state.hasKey}, key holder{else}, keyless{end}. {{ok}}")
+        self.assertEqual(template.fields, (("player", "name"), ("state", "hasKey")))
+        self.assertEqual(template.render({}, {"name": "Ada"}), "Hi Ada, keyless. {ok}")
+        self.assertEqual(template.render({"hasKey": True}, {"name": "Ada"}), "Hi Ada, key holder. {ok}")
+
+    def test_negated_and_nested_branches(self):
+        template = simple_game.Template("{if not state.a}no a{else}a{if state.b} and b{end}{end}")
+        self.assertEqual(template.render({}, {}), "no a")
+        self.assertEqual(template.render({"a": 1, "b": 1}, {}), "a and b")
+
+    def test_render_is_cached_until_a_field_changes(self):
+        template = simple_game.Template("Count: {state.count}")
+        first = template.render({"count": 1, "other": 1}, {})
+        self.assertIs(template.render({"count": 1, "other": 2}, {}), first)
+        self.assertEqual(template.render({"count": 2}, {}), "Count: 2")
+
+    def test_equal_values_of_other_types_render_again(self):
+        template = simple_game.Template("Score: {state.score}")
+        rendered = [template.render({"score": value}, {}) for value in (1.0, 1, True)]
+        self.assertEqual(rendered, ["Score: 1.0", "Score: 1", "Score: True"])
+
+    def test_bad_templates_are_rejected(self):
+        with self.assertRaises(ValueError):
+            simple_game.Template("{if state.a}never closed")
+        with self.assertRaises(ValueError):
+            simple_game.Template("{name}")
+
+    def test_story_templates_read_module_state(self):
+        simple_game.player = {"name": "Tess"}
+        simple_game.state = {}
+        self.assertIn("Hello, **Tess**!", simple_game.get_text_nodes()["greeting"]()["text"])
+
+
+class TestStoryFormat(unittest.TestCase):
+    """Tests for JSON story files and compiled snapshots."""
+
+    STORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stories", "simple_choice.json")
+    WINNING_SCRIPT = ['1', 'Bot', '2', '1', '1', '2', '2']
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot_path = os.path.join(directory.name, "story.snap")
+
+    def test_story_file_matches_built_in_story(self):
+        built_in = headless.play(self.WINNING_SCRIPT)
+        from_file = headless.play(self.WINNING_SCRIPT, simple_game.StoryRegistry(story_format.load(self.STORY_PATH)))
+        self.assertEqual(from_file, built_in)
+        report = explore.explore(simple_game.StoryRegistry(story_format.load(self.STORY_PATH)))
+        self.assertEqual(report.unreachable_nodes, ["deadEnd"])
+        self.assertEqual(report.stuck_states, [])
+
+    def test_snapshot_loads_nodes_lazily(self):
+        story_format.compile_snapshot(benchmarks.synthetic_story_data(2000), self.snapshot_path)
+        snapshot = story_format.load(self.snapshot_path)
+        self.addCleanup(snapshot.close)
+        self.assertEqual(len(snapshot), 2003)
+        self.assertEqual(snapshot._factories, {})
+        self.assertIn("room1999", snapshot)
+        self.assertNotIn("room2000", snapshot)
+        story = simple_game.StoryRegistry(snapshot)
+        result = headless.play(benchmarks.synthetic_script(5), story, max_steps=8)
+        self.assertEqual(result.path[-1], "room5")
+        self.assertEqual(set(snapshot._factories), {"intro", "askName", "room0", "room1", "room2", "room3", "room4", "room5"})
+
+    def test_after_enter_set_state_updates_guards(self):
+        nodes = {
+            "ask": {"text": "Password?", "input_prompt": "> ", "next_text": "hub", "after_enter": {"set_state": "pw"}},
+            "hub": {"text": "The door is {state.pw}.", "choices": [
+                {"text": "Ask", "next_text": "ask"},
+                {"text": "Enter", "next_text": "vault", "required_state": {"key": "pw", "value": "open"}},
+            ]},
+        }
+        story = simple_game.StoryRegistry({node_id: story_format.node_factory(node_id, data) for node_id, data in nodes.items()})
+        session_state = {}
+        with simple_game.bound_session(session_state, {"name": "Wanderer"}):
+            self.assertEqual(len(story.choices("hub", session_state)[1]), 1)
+            with patch.object(story, "invalidate", wraps=story.invalidate) as invalidate:
+                simple_game.step("ask", "open", story)
+            invalidate.assert_called_once_with({"pw"}, set())
+            node, choices = story.choices("hub", session_state)
+        self.assertEqual(len(choices), 2)
+        self.assertEqual(node["text"], "The door is open.")
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_main_plays_compiled_snapshot(self, mock_stdout):
+        with open(self.STORY_PATH, encoding="utf-8") as source:
+            story_format.compile_snapshot(json.load(source)["nodes"], self.snapshot_path)
+        snapshot = story_format.load(self.snapshot_path)
+        self.addCleanup(snapshot.close)
+        saved = simple_game.registry
+        self.addCleanup(setattr, simple_game, "registry", saved)
+        simple_game.use_story(snapshot)
+        with patch('builtins.input', side_effect=self.WINNING_SCRIPT):
+            simple_game.main()
+        self.assertIn("Congratulations, Bot!", mock_stdout.getvalue())
+        self.assertIn("You find a small key!", mock_stdout.getvalue())
+
+    def test_compile_rejects_stories_that_cannot_be_played(self):
+        nodes = {
+            "intro": {"text": "Set {a, b}", "choices": [
+                {"text": "Go", "next_text": "nowhere"},
+                {"text": "Guarded", "next_text": "quit", "required_state": {"op": "=="}},
+            ]},
+        }
+        with self.assertRaises(ValueError) as raised:
+            story_format.compile_snapshot(nodes, self.snapshot_path)
+        message = str(raised.exception)
+        self.assertIn("Bad template field 'a, b'", message)
+        self.assertIn("'nowhere' is not a node", message)
+        self.assertIn("choice 2 has a bad required_state", message)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+    def test_load_story_can_validate(self):
+        path = os.path.join(os.path.dirname(self.snapshot_path), "story.json")
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump({"nodes": {"intro": {"text": "Hi", "choices": [{"text": "Go", "next_text": "missing"}]}}}, out)
+        self.assertIn("intro", story_format.load_story(path)) # Unchecked by default
+        with self.assertRaisesRegex(ValueError, "'missing' is not a node"):
+            story_format.load(path, validate=True)
+        self.assertIn("intro", story_format.load(self.STORY_PATH, validate=True))
+
+    def test_snapshot_from_another_marshal_version_is_rejected(self):
+        story_format.compile_snapshot({"intro": {"text": "Hi"}}, self.snapshot_path)
+        with open(self.snapshot_path, "r+b") as snapshot:
+            snapshot.seek(len(story_format.SNAPSHOT_MAGIC))
+            snapshot.write(struct.pack("<I", marshal.version + 1))
+        with self.assertRaisesRegex(ValueError, "compile it again"):
+            story_format.load(self.snapshot_path)
+
+
+@patch('simple_game.init_game')
+@patch('builtins.input', side_effect=AssertionError("input() must not be called"))
+@patch('sys.stdout', new_callable=io.StringIO)
+class TestInputSources(unittest.TestCase):
+    """Tests for scripted, piped and in-memory input."""
+
+    ROUND = ['1', 'Scripted', '2', '1', '1', '2']
+
+    def setUp(self):
+        simple_game.state = {}
+        simple_game.player = {"name": "Wanderer"}
+
+    def test_many_playthroughs_through_main(self, mock_stdout, mock_input, mock_init):
+        inputs = (self.ROUND + ['1']) * 200 + self.ROUND + ['2'] # Play again 200 times, then quit
+        simple_game.main(source=simple_game.IteratorInput(inputs))
+        output = mock_stdout.getvalue()
+        self.assertEqual(output.count("Congratulations, Scripted!"), 201)
+        self.assertEqual(output.count("Restarting game..."), 200)
+        self.assertTrue(output.endswith("Thanks for playing!\n"))
+
+    def test_end_of_input_quits(self, mock_stdout, mock_input, mock_init):
+        simple_game.main(source=simple_game.IteratorInput(['1']))
+        self.assertIn("What is your name?", mock_stdout.getvalue())
+        self.assertTrue(mock_stdout.getvalue().endswith("Thanks for playing!\n"))
+
+    def test_script_file_and_piped_stream(self, mock_stdout, mock_input, mock_init):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as script:
+            script.write("\n".join(self.ROUND + ['2']) + "\n")
+        self.addCleanup(os.remove, script.name)
+        args = simple_game.parse_args(["--script", script.name])
+        simple_game.main(source=simple_game.open_input(args.script))
+        simple_game.main(source=simple_game.PipedInput(io.StringIO("1\nPiped\n")))
+        output = mock_stdout.getvalue()
+        self.assertIn("Congratulations, Scripted!", output)
+        self.assertIn("Hello, Piped!", output)
+
+    def test_open_input_defaults(self, mock_stdout, mock_input, mock_init):
+        with patch('sys.stdin', FakeTerminal()):
+            self.assertIsInstance(simple_game.open_input(), simple_game.TerminalInput)
+        with patch('sys.stdin', io.StringIO("1\n2\n")):
+            self.assertIsInstance(simple_game.open_input(), simple_game.TerminalInput) # Not read to EOF unasked
+            self.assertEqual(sys.stdin.tell(), 0)
+            self.assertIsInstance(simple_game.open_input("-"), simple_game.PipedInput)
+
+    @patch('sys.stdin', new_callable=lambda: io.StringIO("1\n"))
+    def test_terminal_input_quits_at_end_of_input(self, mock_stdin, mock_stdout, mock_input, mock_init):
+        mock_input.side_effect = EOFError
+        simple_game.main(source=simple_game.open_input())
+        self.assertTrue(mock_stdout.getvalue().endswith("Thanks for playing!\n"))
+
+
+class TestGraphIndex(unittest.TestCase):
+    """Tests for the precomputed graph index and hints."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index = graph_index.GraphIndex()
+
+    def test_adjacency(self):
+        self.assertEqual(self.index.forward["greeting"], {"redRoom", "blueRoom"})
+        self.assertEqual(self.index.reverse["greeting"], {"askName", "redRoom", "blueRoom"})
+        self.assertEqual(self.index.endings, ("secretEnding",))
+
+    def test_distances_account_for_flags(self):
+        self.assertEqual(self.index.distance("greeting", {}), 4)
+        self.assertEqual(self.index.distance("greeting", {"hasKey": True}), 2)
+        self.assertEqual(self.index.distance("intro", {}), 6)
+        self.assertIsNone(self.index.distance("deadEnd", {}))
+
+    def test_hints(self):
+        self.assertEqual(self.index.hint("greeting", {}), (1, 4)) # Blue door first
+        self.assertEqual(self.index.hint("greeting", {"hasKey": True}), (0, 2))
+        self.assertEqual(self.index.hint("redRoom", {"hasKey": True}), (1, 1))
+        self.assertEqual(self.index.hint("askName", {}), (None, 5))
+        self.assertEqual(self.index.hint_text("secretEnding", {"hasKey": True}), "Hint: you're already at secretEnding.")
+
+    def test_other_stories_default_to_their_own_ending(self):
+        index = graph_index.GraphIndex(simple_game.StoryRegistry(benchmarks.synthetic_story(5)))
+        self.assertEqual(index.endings, ("ending",))
+        self.assertEqual(index.hint_text("room3", {"flag0": True}), "Hint: choose 1 (2 steps to ending).")
+        self.assertEqual(index.hint_text("room3", {}, "secretEnding"), "Hint: secretEnding can't be reached from here.")
+        self.assertIsNone(index.distance("room3", {}, "secretEnding"))
+        no_endings = graph_index.GraphIndex(simple_game.StoryRegistry(
+            {"intro": lambda: {"id": "intro", "text": "", "choices": [{"text": "Stay", "next_text": "intro"}]}}
+        ))
+        self.assertEqual(no_endings.hint_text("intro", {}), "Hint: this story has no ending to aim for.")
+
+    @patch('builtins.input', side_effect=['h', '2'])
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_in_game_hint_command(self, mock_stdout, mock_input):
+        simple_game.state = {}
+        with patch('simple_game.hint_index', self.index):
+            next_node_id, _ = simple_game.show_text_node("greeting")
+        self.assertEqual(next_node_id, "blueRoom")
+        self.assertIn("H. Hint", mock_stdout.getvalue())
+        self.assertIn("Hint: choose 2 (4 steps to secretEnding).", mock_stdout.getvalue())
+
+
+@unittest.skipIf(montecarlo.np is None, "NumPy is not installed")
+class TestMonteCarlo(unittest.TestCase):
+    """Tests for the vectorized ending-distribution estimator."""
+
+    def fork_story(self):
+        return simple_game.StoryRegistry({
+            "intro": lambda: {"id": "intro", "text": "", "choices": [
+                {"text": "Left", "next_text": "left"},
+                {"text": "Right", "next_text": "right"},
+            ]},
+            "left": lambda: {"id": "left", "text": "", "choices": [{"text": "Quit", "next_text": "quit"}]},
+            "right": lambda: {"id": "right", "text": "", "choices": [
+                {"text": "Again", "next_text": "intro"},
+                {"text": "Stop", "next_text": "quit"},
+            ]},
+        })
+
+    def test_uniform_players(self):
+        result = montecarlo.estimate(self.fork_story(), players=200_000, seed=7, max_steps=200)
+        # Left ends at once; right ends half the time and otherwise starts over: P(left) = 2/3
+        self.assertAlmostEqual(result.endings["left", "quit"], 2 / 3, delta=0.01)
+        self.assertAlmostEqual(result.endings["right", "quit"], 1 / 3, delta=0.01)
+        self.assertEqual(result.unfinished, 0)
+        self.assertAlmostEqual(result.steps["left", "quit"][2], 0.5, delta=0.01) # intro -> left -> quit
+        self.assertAlmostEqual(result.visits["intro"], 4 / 3, delta=0.02)
+
+    def test_weighted_players_and_built_in_story(self):
+        always_left = lambda node_id, position: 1.0 if position == 0 else 0.0
+        result = montecarlo.estimate(self.fork_story(), players=1000, seed=1, weight=always_left)
+        self.assertEqual(result.endings, {("left", "quit"): 1.0, ("right", "quit"): 0.0})
+        built_in = montecarlo.estimate(players=10_000, seed=3)
+        self.assertEqual(set(built_in.endings), {("secretEnding", "restart"), ("secretEnding", "quit")})
+        self.assertAlmostEqual(sum(built_in.endings.values()) + built_in.unfinished, 1.0)
+        self.assertAlmostEqual(built_in.endings["secretEnding", "quit"], built_in.endings["secretEnding", "restart"], delta=0.05)
+        self.assertAlmostEqual(built_in.visits["askName"], 1.0)
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests for the opt-in game loop instrumentation."""
+
+    def setUp(self):
+        simple_game.state = {}
+        simple_game.player = {"name": "Wanderer"}
+        self.metrics = metrics.Metrics()
+        patcher = patch('simple_game.metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('simple_game.init_game')
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_playthrough_is_measured(self, mock_stdout, mock_init):
+        simple_game.registry.clear()
+        simple_game.main(source=simple_game.IteratorInput(['1', 'Tester', 'x', '2', '1', '1', '2', '2']))
+        for phase in ("build", "guards", "render", "present", "input"):
+            self.assertGreater(self.metrics.phases[phase].count, 0, phase)
+        self.assertEqual(self.metrics.phases["input"].count, 8) # Including the invalid 'x'
+        self.assertEqual(self.metrics.nodes["greeting"].count, 2)
+        self.assertEqual(self.metrics.choices["greeting", "Open the blue door"], 1)
+        self.assertEqual(self.metrics.choices["redRoom", "Check for secrets (requires key)"], 1)
+        self.assertEqual(self.metrics.set_state, {"hasKey": 1})
+
+    def test_exports(self):
+        self.metrics.observe("render", 0.002)
+        self.metrics.observe_node("intro", 20.0)
+        self.metrics.count_choice("intro", {"text": 'Say "hi"'})
+        text = self.metrics.to_prometheus()
+        self.assertIn('simple_game_phase_seconds_bucket{phase="render",le="0.0025"} 1', text)
+        self.assertIn('simple_game_phase_seconds_bucket{phase="render",le="0.001"} 0', text)
+        self.assertIn('simple_game_node_seconds_bucket{node="intro",le="+Inf"} 1', text)
+        self.assertIn('simple_game_choice_selections_total{node="intro",choice="Say \\"hi\\""} 1', text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            self.metrics.write(path)
+            with open(path, encoding="utf-8") as dumped:
+                data = json.load(dumped)
+        self.assertEqual(data["phases"]["render"]["count"], 1)
+        self.assertEqual(data["choices"], [{"node": "intro", "choice": 'Say "hi"', "count": 1}])
+        self.assertEqual(simple_game.parse_args(["--metrics", path]).metrics, path)
+
+
+class TestHistory(unittest.TestCase):
+    """Tests for persistent snapshots and the back command."""
+
+    def test_pmap_shares_structure(self):
+        class Clash(str):
+            def __hash__(self):
+                return 7 # Every key collides
+        base = history.PMap({f"key{i}": i for i in range(100)})
+        changed = base.set("key5", -5).set(Clash("a"), 1).set(Clash("b"), 2)
+        self.assertEqual(base["key5"], 5)
+        self.assertEqual(changed["key5"], -5)
+        self.assertEqual((changed[Clash("a")], changed[Clash("b")], len(changed)), (1, 2, 102))
+        self.assertIs(base.set("key1", 1), base)
+        self.assertEqual(base.diff(changed), {"key5": (5, -5), Clash("a"): (None, 1), Clash("b"): (None, 2)})
+        self.assertIs(history.snapshot(base, dict(base)), base)
+        self.assertEqual(dict(history.snapshot(base, {"x": 1})), {"x": 1})
+
+    def test_long_history_back_and_branches(self):
+        timeline = history.History("intro", {}, {"name": "Wanderer"})
+        live = {}
+        for i in range(5000):
+            live["count"] = i
+            timeline.record(f"room{i}", live, {"name": "Wanderer"})
+        self.assertIs(timeline.current.player, timeline.current.parent.player) # Unchanged dicts are shared
+        fork = timeline.back(4000)
+        self.assertEqual((fork.node_id, fork.state["count"]), ("room999", 999))
+        timeline.record("elsewhere", {"count": 999, "detour": True}, {"name": "Wanderer"})
+        first, second = timeline.branches()
+        comparison = timeline.compare(first, second)
+        self.assertEqual(comparison["fork"], "room999")
+        self.assertEqual(comparison["second"], ["elsewhere"])
+        self.assertEqual(len(comparison["first"]), 4000)
+        self.assertEqual(comparison["state"], {"count": (4999, 999), "detour": (None, True)})
+        timeline.back()
+        self.assertEqual(timeline.forward().node_id, "elsewhere")
+        self.assertIsNone(timeline.forward())
+
+    @patch('builtins.input', side_effect=['2', '1', '1', 'b', 'b'])
+    @patch('sys.stdout', new_callable=io.StringIO)
+    def test_back_command(self, mock_stdout, mock_input):
+        simple_game.state = {}
+        simple_game.player = {"name": "Wanderer"}
+        with patch('simple_game.history', history.History("greeting", {}, {"name": "Wanderer"})):
+            self.assertEqual(simple_game.show_text_node("greeting")[0], "blueRoom")
+            self.assertEqual(simple_game.show_text_node("blueRoom")[0], "greeting")
+            self.assertEqual(simple_game.state, {"hasKey": True})
+            self.assertEqual(simple_game.show_text_node("greeting")[0], "redRoom")
+            _, choices = simple_game.registry.choices("redRoom", simple_game.state)
+            self.assertEqual(len(choices), 2)
+            self.assertEqual(simple_game.show_text_node("redRoom"), ("greeting", None))
+            self.assertEqual(simple_game.show_text_node("greeting"), ("blueRoom", None))
+        self.assertEqual(simple_game.state, {})
+        _, choices = simple_game.registry.choices("redRoom", simple_game.state)
+        self.assertEqual(len(choices), 1) # The key guard was checked again
+        self.assertIn("B. Back", mock_stdout.getvalue())
+
+
+class TestStartup(unittest.TestCase):
+    """Tests for the cold start path."""
+
+    def test_import_builds_nothing_heavy(self):
+        probe = (
+            "import sys; before = set(sys.modules); import simple_game; simple_game.Template('Plain text').render(); "
+            "print(sorted({'re', 'shutil', 'argparse'} & (set(sys.modules) - before)), simple_game._templates, simple_game.registry._cache)"
+        )
+        directory = os.path.dirname(os.path.abspath(simple_game.__file__))
+        output = subprocess.run([sys.executable, "-c", probe], cwd=directory, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[] {} {}")
+
+    def test_bare_launch_skips_argparse_with_the_same_defaults(self):
+        defaults = vars(simple_game.parse_args([]))
+        parsed = vars(simple_game.parse_args(["--startup-profile"]))
+        self.assertTrue(parsed.pop("startup_profile"))
+        self.assertFalse(defaults.pop("startup_profile"))
+        self.assertEqual(defaults, parsed)
+
+    def test_known_options_are_parsed_without_argparse(self):
+        parsed = vars(simple_game.parse_args(["--story", "story.snap", "--hints", "--metrics=out.json"]))
+        self.assertEqual(parsed["story"], "story.snap")
+        self.assertTrue(parsed["hints"])
+        self.assertEqual(parsed["metrics"], "out.json")
+        self.assertIsNone(parsed["journal"])
+        self.assertFalse(parsed["back"])
+
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_unknown_options_are_left_to_argparse(self, mock_stderr):
+        for argv in (["--bogus"], ["--story"], ["--hints=yes"]):
+            with self.assertRaises(SystemExit):
+                simple_game.parse_args(argv)
+        self.assertIn("usage:", mock_stderr.getvalue())
+
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_startup_profile_reports_first_frame_once(self, mock_stderr):
+        with patch('simple_game.renderer', simple_game.Renderer(io.StringIO())):
+            simple_game.profile_startup(time.perf_counter())
+            simple_game.renderer.present(["Title"])
+            simple_game.renderer.present(["Title"])
+        self.assertEqual(mock_stderr.getvalue().count("Startup: import"), 1)
+        self.assertIn("first frame", mock_stderr.getvalue())
+
+
 # --- Test Execution Block (Unchanged) ---
 if __name__ == '__main__':
     print("--- Discovering and running tests ---")
     suite = unittest.TestSuite()
     suite.addTest(loader.loadTestsFromTestCase(TestSimpleGameUnit))
     suite.addTest(loader.loadTestsFromTestCase(TestSimpleGameIntegration))
+    suite.addTest(loader.loadTestsFromTestCase(TestStoryRegistry))
+    suite.addTest(loader.loadTestsFromTestCase(TestHeadless))
+    suite.addTest(loader.loadTestsFromTestCase(TestExplorer))
+    suite.addTest(loader.loadTestsFromTestCase(TestRenderer))
+    suite.addTest(loader.loadTestsFromTestCase(TestServer))
+    suite.addTest(loader.loadTestsFromTestCase(TestCompactState))
+    suite.addTest(loader.loadTestsFromTestCase(TestJournal))
+    suite.addTest(loader.loadTestsFromTestCase(TestBenchmarks))
+    suite.addTest(loader.loadTestsFromTestCase(TestConditions))
+    suite.addTest(loader.loadTestsFromTestCase(TestTemplates))
+    suite.addTest(loader.loadTestsFromTestCase(TestStoryFormat))
+    suite.addTest(loader.loadTestsFromTestCase(TestInputSources))
+    suite.addTest(loader.loadTestsFromTestCase(TestGraphIndex))
+    suite.addTest(loader.loadTestsFromTestCase(TestMonteCarlo))
+    suite.addTest(loader.loadTestsFromTestCase(TestMetrics))
+    suite.addTest(loader.loadTestsFromTestCase(TestHistory))
+    suite.addTest(loader.loadTestsFromTestCase(TestStartup))
     runner = unittest.TextTestRunner(verbosity=2)
     test_result = runner.run(suite)
 
@@ -237,6 +1143,23 @@ if __name__ == '__main__':
         suite_for_coverage = unittest.TestSuite()
         suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestSimpleGameUnit))
         suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestSimpleGameIntegration))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestStoryRegistry))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestHeadless))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestExplorer))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestRenderer))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestServer))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestCompactState))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestJournal))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestBenchmarks))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestConditions))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestTemplates))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestStoryFormat))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestInputSources))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestGraphIndex))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestMonteCarlo))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestMetrics))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestHistory))
+        suite_for_coverage.addTest(loader.loadTestsFromTestCase(TestStartup))
         runner_for_coverage = unittest.TextTestRunner(stream=io.StringIO())
         runner_for_coverage.run(suite_for_coverage)
         cov.stop()